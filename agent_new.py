@@ -1,65 +1,86 @@
 """LangChain agent for hackathon team matching"""
 
 import json
+import math
+import time
 from pathlib import Path
 from langchain_anthropic import ChatAnthropic
 from langchain.tools import tool
-from langchain_core.messages import HumanMessage, ToolMessage
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
 import os
 from dotenv import load_dotenv
-from excel_data_loader import ExcelDataLoader
+from excel_data_loader import ExcelDataLoader, build_people_index, roster_version, score_candidates
+from instrumentation import configure_logging, metrics, profiled, span, span_generator
 
 load_dotenv()
 
+# How much of each tool result to surface in streamed tool_end events
+TOOL_PREVIEW_CHARS = 300
+# Agent loop control
+MAX_ITERATIONS = 3
+NUM_MATCHES = 3
+# Distinct candidates found by the tools after which searching stops
+ENOUGH_CANDIDATES = 8
+# Candidates shown to the model when it writes the final answer
+MAX_ANSWER_CANDIDATES = 40
+# Tools that list people without searching; their results don't count towards ENOUGH_CANDIDATES
+UNTARGETED_TOOLS = {"get_all_people"}
+# Extra answer attempts when the structured answer fails validation
+ANSWER_REPAIR_RETRIES = 1
+
+ANSWER_FORMAT = """ANSWER FORMAT: one JSON object per line and nothing else, using ids from the tool results:
+{"id": <roster id>, "name": "<name>", "reason": "<ONE sentence why they fit>", "score": <0-100>}"""
+
 
 # Load people data from Excel
-data_loader = ExcelDataLoader("../lessie_export.xlsx")
+data_loader = ExcelDataLoader(os.getenv("ROSTER_PATH", "../lessie_export.xlsx"))
 PEOPLE_DATA = data_loader.get_all_people()
+PEOPLE_INDEX = build_people_index(PEOPLE_DATA)
+ROSTER_VERSION = roster_version(PEOPLE_DATA)
+
+
+def set_people_data(people: list) -> None:
+    """Replace the roster the tools search over (e.g. with a synthetic one)"""
+    global PEOPLE_DATA, PEOPLE_INDEX, ROSTER_VERSION
+    PEOPLE_DATA = people
+    PEOPLE_INDEX = build_people_index(people)
+    ROSTER_VERSION = roster_version(people)
 
 
 @tool
 def search_people_by_skill(skill: str) -> list:
     """Search for people with a specific skill"""
-    results = []
-    for person in PEOPLE_DATA:
-        if skill.lower() in [s.lower() for s in person["skills"]]:
-            results.append({
-                "name": person["name"],
-                "skills": person["skills"],
-                "interests": person["interests"],
-                "experience_level": person["experience_level"]
-            })
-    return results
+    return [{
+        "id": person["id"],
+        "name": person["name"],
+        "skills": person["skills"],
+        "interests": person["interests"],
+        "experience_level": person["experience_level"]
+    } for person in PEOPLE_INDEX["skills"].get(skill.lower(), [])]
 
 
 @tool
 def search_people_by_interest(interest: str) -> list:
     """Search for people interested in a specific topic"""
-    results = []
-    for person in PEOPLE_DATA:
-        if interest.lower() in [i.lower() for i in person["interests"]]:
-            results.append({
-                "name": person["name"],
-                "skills": person["skills"],
-                "interests": person["interests"],
-                "experience_level": person["experience_level"]
-            })
-    return results
+    return [{
+        "id": person["id"],
+        "name": person["name"],
+        "skills": person["skills"],
+        "interests": person["interests"],
+        "experience_level": person["experience_level"]
+    } for person in PEOPLE_INDEX["interests"].get(interest.lower(), [])]
 
 
 @tool
 def search_people_by_role(role: str) -> list:
     """Search for people interested in a specific role"""
-    results = []
-    for person in PEOPLE_DATA:
-        if role.lower() in [r.lower() for r in person["role_preferences"]]:
-            results.append({
-                "name": person["name"],
-                "role_preferences": person["role_preferences"],
-                "experience_level": person["experience_level"],
-                "skills": person["skills"]
-            })
-    return results
+    return [{
+        "id": person["id"],
+        "name": person["name"],
+        "role_preferences": person["role_preferences"],
+        "experience_level": person["experience_level"],
+        "skills": person["skills"]
+    } for person in PEOPLE_INDEX["role_preferences"].get(role.lower(), [])]
 
 
 @tool
@@ -99,19 +120,150 @@ Team Composition Analysis:
 """
 
 
+def _content_text(content) -> str:
+    """Text of a message's content, whether a plain string or a list of content blocks"""
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block.get("text", "") if isinstance(block, dict) else str(block)
+        for block in content or []
+        if not isinstance(block, dict) or block.get("type", "text") == "text"
+    )
+
+
+def _validate_match(entry) -> tuple:
+    """
+    Check one structured answer entry against the roster.
+    
+    Returns (match, problem): a normalized match dict, or None and a short
+    description of what was wrong with the entry.
+    """
+    if not isinstance(entry, dict):
+        return None, f"not a JSON object: {entry!r}"
+    by_id = None
+    try:
+        by_id = PEOPLE_INDEX["id"].get(int(entry.get("id")))
+    except (TypeError, ValueError):
+        pass
+    name = str(entry.get("name", "")).strip()
+    by_name = PEOPLE_INDEX["name"].get(name.lower()) if name else None
+    if by_id is not None and (not name or str(by_id["name"]).lower() == name.lower()):
+        person = by_id
+    elif by_id is not None and by_name is None:
+        # The reason was written about someone who is not in the roster
+        return None, f"id {by_id['id']} is {by_id['name']}, not {name!r}; use an id and name from the candidates"
+    else:
+        # Trust the name over a wrong or missing id
+        person = by_name
+    if person is None:
+        return None, f"no person with id {entry.get('id')!r} / name {name!r} in the roster"
+    reason = str(entry.get("reason", "")).strip()
+    if not reason:
+        return None, f"missing reason for {person['name']}"
+    try:
+        score = float(entry.get("score", 0))
+    except (TypeError, ValueError):
+        score = math.nan
+    if not math.isfinite(score):
+        return None, f"score for {person['name']} is not a number"
+    score = max(0.0, min(100.0, score))
+    return {
+        "id": person["id"],
+        "name": person["name"],
+        "title": person.get("title", "Unknown"),
+        "reason": reason,
+        "score": score
+    }, None
+
+
+def _parse_answer_line(line: str) -> tuple:
+    """Parse one line of a JSON-lines answer; (None, None) for lines that aren't JSON"""
+    line = line.strip().rstrip(",")
+    if not line.startswith("{"):
+        return None, None
+    try:
+        return _validate_match(json.loads(line))
+    except json.JSONDecodeError as e:
+        return None, f"invalid JSON ({e.msg}): {line[:80]}"
+
+
+def _format_matches(matches: list) -> str:
+    """Render structured matches in the classic NAME (role) - why format"""
+    return "\n".join(
+        f"{i}. {m['name']} ({m['title']}) - {m['reason']} [score {m['score']:g}]"
+        for i, m in enumerate(matches, 1)
+    )
+
+
+class _LoopState:
+    """Per-call bookkeeping for the agent loop"""
+    
+    def __init__(self, user_profile: dict, shortlist: list = None):
+        self.user_profile = user_profile
+        self.llm_calls = 0
+        # Precomputed candidates (roster people, best first), offered before search results
+        self.shortlist = shortlist or []
+        # (tool name, canonical args) -> tool_call_id that produced the result
+        self.tool_results = {}
+        # person id -> number of tool results the person appeared in
+        self.candidates = {}
+        # ids found by targeted searches (not by listing everyone)
+        self.searched = set()
+    
+    def add_candidates(self, tool_result, targeted: bool = True) -> None:
+        if not isinstance(tool_result, list):
+            return
+        for item in tool_result:
+            if not isinstance(item, dict):
+                continue
+            person = PEOPLE_INDEX["id"].get(item.get("id")) or PEOPLE_INDEX["name"].get(str(item.get("name", "")).lower())
+            if person is not None:
+                self.candidates[person["id"]] = self.candidates.get(person["id"], 0) + 1
+                if targeted:
+                    self.searched.add(person["id"])
+    
+    def candidate_count(self) -> int:
+        return len(self.searched | {p["id"] for p in self.shortlist})
+    
+    def top_candidates(self, limit: int) -> list:
+        """Shortlist first, then found people by overlap with the profile, then by how often they were found"""
+        fit = dict(score_candidates(self.user_profile, PEOPLE_INDEX, len(PEOPLE_DATA)))
+        ranked = sorted(self.candidates, key=lambda person_id: (-fit.get(person_id, 0.0),
+                                                                -self.candidates[person_id], person_id))
+        ids = dict.fromkeys([p["id"] for p in self.shortlist] + ranked)
+        return [PEOPLE_INDEX["id"][person_id] for person_id in list(ids)[:limit]]
+
+
 class HackathonMatchingAgent:
     """LangChain agent for matching people for hackathon teams"""
     
-    def __init__(self):
-        api_key = os.getenv("ANTHROPIC_API_KEY")
-        if not api_key:
-            raise ValueError("ANTHROPIC_API_KEY not found in .env")
+    def __init__(self, llm=None, max_iterations: int = MAX_ITERATIONS,
+                 enough_candidates: int = ENOUGH_CANDIDATES,
+                 max_answer_candidates: int = MAX_ANSWER_CANDIDATES):
+        """
+        Args:
+            llm: Optional chat model to use instead of Claude (e.g. a
+                 ReplayChatModel from llm_replay for offline runs)
+            max_iterations: Upper bound on tool-calling turns per match
+            enough_candidates: Stop searching once this many distinct people were found
+            max_answer_candidates: Candidates shown to the model for the final answer
+        """
+        self.max_iterations = max_iterations
+        self.enough_candidates = enough_candidates
+        self.max_answer_candidates = max_answer_candidates
         
-        self.llm = ChatAnthropic(
-            model="claude-sonnet-4-20250514",
-            temperature=0.7,
-            api_key=api_key
-        )
+        if llm is None:
+            api_key = os.getenv("ANTHROPIC_API_KEY")
+            if not api_key:
+                raise ValueError("ANTHROPIC_API_KEY not found in .env")
+            
+            llm = ChatAnthropic(
+                model="claude-sonnet-4-20250514",
+                temperature=0.7,
+                api_key=api_key
+            )
+        
+        self.llm = llm
         
         self.tools = [
             search_people_by_skill,
@@ -123,7 +275,7 @@ class HackathonMatchingAgent:
         
         self.llm_with_tools = self.llm.bind_tools(self.tools)
     
-    def match_person(self, user_profile: dict) -> dict:
+    def match_person(self, user_profile: dict, shortlist: list = None) -> dict:
         """
         Main agent function: Given a user profile, find the best matches
         
@@ -136,86 +288,272 @@ class HackathonMatchingAgent:
                 "role_preferences": list,
                 "preferences": str (what they're looking for)
             }
+            shortlist: Optional precomputed candidate ids, best first (see
+                       precompute_shortlists.py). With enough of them the
+                       tool search is skipped entirely.
+        
+        Returns:
+            {"matches": str, "success": bool, "structured": list of
+             {"id", "name", "title", "reason", "score"}, "iterations": int}
         """
+        result = None
+        # Profiled here rather than in stream_match, whose consumer runs between yields
+        with profiled("match_person"):
+            for event in self.stream_match(user_profile, shortlist=shortlist):
+                if event["type"] == "final":
+                    result = {key: event[key] for key in ("matches", "success", "structured", "iterations")}
+        return result
+    
+    def stream_match(self, user_profile: dict, shortlist: list = None):
+        """
+        Streaming variant of match_person that yields events as they happen:
         
-        prompt = f"""
-You are a hackathon team matching expert. QUICKLY find 3 BEST matches for this person.
-
-USER:
+            {"type": "token", "text": str}                       raw model output (the answer
+                                                                  arrives as JSON lines)
+            {"type": "tool_start", "name": str, "args": dict, "id": str}
+            {"type": "tool_end", "name": str, "id": str, "count": int | None,
+             "bytes": int, "preview": str, "cached": bool}       partial tool result
+            {"type": "match", "match": dict}                     one validated match, as soon
+                                                                  as its answer line is complete
+            {"type": "final", "matches": str, "success": bool, "structured": list,
+             "iterations": int}                                  same as match_person
+        
+        Every match in the final result was yielded as a match event first, so
+        a UI can show matches from those events and ignore the tokens.
+        """
+        shortlisted = [PEOPLE_INDEX["id"][i] for i in shortlist or [] if i in PEOPLE_INDEX["id"]]
+        messages = [HumanMessage(content=self._build_prompt(user_profile, shortlisted))]
+        
+        yield from span_generator(
+            "agent.match",
+            self._run_agent_loop(user_profile, messages, _LoopState(user_profile, shortlisted)),
+            user=user_profile.get('name', 'Unknown'),
+            shortlist=len(shortlisted)
+        )
+    
+    def _profile_summary(self, user_profile: dict) -> str:
+        """The USER block shared by the search and answer prompts"""
+        return f"""USER:
 - Name: {user_profile.get('name', 'Unknown')}
 - Skills: {', '.join(user_profile.get('skills', []))}
 - Interests: {', '.join(user_profile.get('interests', []))}
 - Experience: {user_profile.get('experience_level', 'unknown')}
 - Roles: {', '.join(user_profile.get('role_preferences', []))}
-- Goal: {user_profile.get('preferences', 'complementary team')}
+- Goal: {user_profile.get('preferences', 'complementary team')}"""
+    
+    def _build_prompt(self, user_profile: dict, shortlisted: list = None) -> str:
+        """Build the matching instructions for a user profile"""
+        shortlist_block = ""
+        if shortlisted:
+            listing = "\n".join(f"- id {p['id']}: {p['name']} ({p.get('title', 'Unknown')})" for p in shortlisted)
+            shortlist_block = f"\nPRECOMPUTED SHORTLIST (start here, search only for what it lacks):\n{listing}\n"
+        return f"""
+You are a hackathon team matching expert. QUICKLY find {NUM_MATCHES} BEST matches for this person.
 
-SEARCH FOR 3 BEST MATCHES:
+{self._profile_summary(user_profile)}
+{shortlist_block}
+SEARCH FOR {NUM_MATCHES} BEST MATCHES:
 1. Search people with skills they need
 2. Search people with shared interests
 3. Get top candidates
-4. RETURN 3 MATCHES WITH WHY (stop after this - NO MORE SEARCHING)
+4. RETURN {NUM_MATCHES} MATCHES WITH WHY (stop after this - NO MORE SEARCHING)
 
-Format: NAME (role/skills) - ONE sentence why they fit
+{ANSWER_FORMAT}
 """
+    
+    def _build_answer_prompt(self, user_profile: dict, candidates: list, problems: list) -> str:
+        """Ask for the final structured answer from the candidates the tools found"""
+        if candidates:
+            listing = "\n".join(json.dumps({
+                "id": p["id"],
+                "name": p["name"],
+                "title": p.get("title", "Unknown"),
+                "skills": p["skills"],
+                "interests": p["interests"],
+                "experience_level": p["experience_level"],
+                "role_preferences": p["role_preferences"]
+            }) for p in candidates)
+            source = f"CANDIDATES (pick only from these):\n{listing}"
+        else:
+            source = "No candidates were found by search; pick from people you know are in the roster."
+        feedback = ""
+        if problems:
+            feedback = "\nYOUR PREVIOUS ANSWER HAD PROBLEMS, fix them:\n" + "\n".join(f"- {p}" for p in problems) + "\n"
+        return f"""
+You are a hackathon team matching expert. Choose the {NUM_MATCHES} BEST matches for this person.
+
+{self._profile_summary(user_profile)}
+
+{source}
+{feedback}
+{ANSWER_FORMAT}
+"""
+    
+    def _stream_response(self, llm, messages: list):
+        """Stream one model turn, yielding token events, and return the full AIMessage"""
+        response = yield from span_generator("llm.invoke", self._stream_chunks(llm, messages))
+        if response is None:
+            return AIMessage(content="")
+        # Keep the provider's content blocks so tool_use ids line up with the ToolMessages
+        return AIMessage(content=response.content, tool_calls=response.tool_calls)
+    
+    def _stream_chunks(self, llm, messages: list):
+        """Yield token events for one model turn and return the merged chunk (None if empty)"""
+        response = None
+        start = time.perf_counter()
+        for chunk in llm.stream(messages):
+            if response is None:
+                metrics.observe("llm_first_chunk_seconds", time.perf_counter() - start)
+            response = chunk if response is None else response + chunk
+            text = _content_text(chunk.content)
+            if text:
+                yield {"type": "token", "text": text}
+        return response
+    
+    def _run_agent_loop(self, user_profile: dict, messages: list, state: _LoopState):
+        """Search with tools until enough candidates are found, then produce the structured answer"""
+        answer_text = None
         
-        messages = [HumanMessage(content=prompt)]
+        # A full enough shortlist needs no searching at all
+        if state.candidate_count() >= self.enough_candidates:
+            metrics.inc("agent_shortlist_hits_total")
+            iterations = 0
+        else:
+            iterations = self.max_iterations
         
-        # Agentic loop with tool execution
-        max_iterations = 3
-        iteration = 0
+        for iteration in range(1, iterations + 1):
+            answer_text = yield from span_generator("agent.iteration", self._search_turn(messages, state),
+                                                    iteration=iteration)
+            if answer_text is not None:
+                break
+            if state.candidate_count() >= self.enough_candidates:
+                metrics.inc("agent_early_exits_total")
+                break
+        
+        yield from self._final_answer(user_profile, state, answer_text)
+    
+    def _search_turn(self, messages: list, state: _LoopState):
+        """One tool-calling turn; returns the answer text if the model answered instead of calling tools"""
+        response = yield from self._stream_response(self.llm_with_tools, messages)
+        state.llm_calls += 1
+        messages.append(response)
         
-        while iteration < max_iterations:
-            iteration += 1
-            response = self.llm_with_tools.invoke(messages)
-            messages.append(response)
+        # No tool calls means the model is answering
+        if not response.tool_calls:
+            return _content_text(response.content)
+        
+        yield from self._execute_tools(response.tool_calls, messages, state)
+        return None
+    
+    def _execute_tools(self, tool_calls: list, messages: list, state: _LoopState):
+        """Run the requested tools, answering repeated identical calls from the session cache"""
+        for tool_call in tool_calls:
+            tool_name = tool_call["name"]
+            tool_input = tool_call["args"]
+            tool_call_id = tool_call.get("id") or str(hash(tool_name))
+            cache_key = (tool_name, json.dumps(tool_input, sort_keys=True, default=str))
             
-            # Check if response has tool calls
-            if not response.tool_calls:
-                # Got response without tool calls, return it
-                if response.content and len(response.content) > 10:
-                    return {
-                        "matches": response.content,
-                        "success": True
-                    }
+            yield {"type": "tool_start", "name": tool_name, "args": tool_input, "id": tool_call_id}
             
-            # Process tool calls
-            if response.tool_calls:
-                tool_executed = False
-                for tool_call in response.tool_calls:
-                    tool_name = tool_call["name"]
-                    tool_input = tool_call["args"]
-                    
-                    # Find and execute the tool
-                    tool_func = next((t for t in self.tools if t.name == tool_name), None)
-                    if tool_func:
-                        tool_executed = True
+            tool_func = next((t for t in self.tools if t.name == tool_name), None)
+            count = None
+            cached = cache_key in state.tool_results
+            if cached:
+                # Every tool call still needs a ToolMessage; point back at the earlier result
+                metrics.inc("tool_calls_deduped_total", tool=tool_name)
+                content = f"Same call as {state.tool_results[cache_key]} earlier in this session; see that result."
+            elif tool_func is None:
+                content = f"Unknown tool: {tool_name}"
+            else:
+                try:
+                    with span("tool.invoke", tool=tool_name):
                         tool_result = tool_func.invoke(tool_input)
-                        # Use proper ToolMessage format
-                        tool_message = ToolMessage(
-                            content=json.dumps(tool_result) if isinstance(tool_result, (dict, list)) else str(tool_result),
-                            tool_call_id=tool_call.get("id", str(hash(tool_name)))
-                        )
-                        messages.append(tool_message)
-                
-                # If no tools were executed, break to avoid infinite loop
-                if not tool_executed:
-                    break
-        
-        # Return last response content if we have it
-        for msg in reversed(messages):
-            if hasattr(msg, 'content') and isinstance(msg.content, str) and len(msg.content) > 10:
-                return {
-                    "matches": msg.content,
-                    "success": True
-                }
-        
-        return {
-            "matches": "Could not find matches after max iterations",
-            "success": False
+                except Exception as e:
+                    # Bad arguments from the model (or a failing tool) go back to it as the
+                    # tool result so it can correct the call, instead of ending the match
+                    metrics.inc("tool_errors_total", tool=tool_name)
+                    content = f"Error calling {tool_name}: {e}"
+                else:
+                    with span("tool.serialize", tool=tool_name):
+                        content = json.dumps(tool_result) if isinstance(tool_result, (dict, list)) else str(tool_result)
+                    state.tool_results[cache_key] = tool_call_id
+                    state.add_candidates(tool_result, targeted=tool_name not in UNTARGETED_TOOLS)
+                    count = len(tool_result) if isinstance(tool_result, list) else None
+            
+            size = len(content.encode("utf-8"))
+            metrics.observe("tool_message_bytes", size,
+                            buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576), tool=tool_name)
+            yield {
+                "type": "tool_end",
+                "name": tool_name,
+                "id": tool_call_id,
+                "count": count,
+                "bytes": size,
+                "preview": content[:TOOL_PREVIEW_CHARS],
+                "cached": cached
+            }
+            messages.append(ToolMessage(content=content, tool_call_id=tool_call_id))
+    
+    def _final_answer(self, user_profile: dict, state: _LoopState, answer_text):
+        """Validate the model's answer against the roster, asking again (bounded) if it falls short"""
+        wanted = min(NUM_MATCHES, len(PEOPLE_DATA))
+        matches = {}
+        problems = []
+        
+        if answer_text is not None:
+            # The answer was already streamed as tokens while the loop ran
+            for line in answer_text.splitlines():
+                yield from self._accept_line(line, matches, wanted, problems)
+            if not matches and not problems:
+                problems.append(f"answer was not in the required JSON-lines format: {answer_text[:120]!r}")
+        
+        attempts = 0
+        max_attempts = ANSWER_REPAIR_RETRIES + (1 if answer_text is None else 0)
+        while len(matches) < wanted and attempts < max_attempts:
+            attempts += 1
+            if answer_text is not None or attempts > 1:
+                metrics.inc("structured_answer_repairs_total")
+            if matches:
+                problems.append(f"only {len(matches)} valid matches; need {wanted} distinct people")
+            prompt = self._build_answer_prompt(user_profile, state.top_candidates(self.max_answer_candidates), problems)
+            problems = []
+            yield from span_generator("agent.answer", self._answer_attempt(prompt, matches, wanted, problems),
+                                      attempt=attempts)
+            state.llm_calls += 1
+        
+        structured = list(matches.values())
+        metrics.observe("agent_llm_calls", state.llm_calls, buckets=(1, 2, 3, 4, 5, 6, 8))
+        yield {
+            "type": "final",
+            "matches": _format_matches(structured) if structured else "Could not find valid matches",
+            "success": bool(structured),
+            "structured": structured,
+            "iterations": state.llm_calls
         }
+    
+    def _answer_attempt(self, prompt: str, matches: dict, wanted: int, problems: list):
+        """Stream one answer, validating each JSON line as soon as it is complete"""
+        buffer = ""
+        for event in self._stream_response(self.llm, [HumanMessage(content=prompt)]):
+            yield event
+            buffer += event["text"]
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                yield from self._accept_line(line, matches, wanted, problems)
+        yield from self._accept_line(buffer, matches, wanted, problems)
+    
+    def _accept_line(self, line: str, matches: dict, wanted: int, problems: list):
+        """Validate one streamed answer line, yielding a match event if it is new and valid"""
+        match, problem = _parse_answer_line(line)
+        if match and match["id"] not in matches and len(matches) < wanted:
+            matches[match["id"]] = match
+            yield {"type": "match", "match": match}
+        elif problem:
+            problems.append(problem)
 
 
 if __name__ == "__main__":
+    configure_logging()
     agent = HackathonMatchingAgent()
     
     user_profile = {
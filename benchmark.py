@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""Offline benchmark suite for the matching agent, tools, loader and Redis memory
+
+Runs against synthetic rosters of several sizes with a ReplayChatModel in
+place of Claude, so no API key or network is needed and every run is
+deterministic.
+
+    python3 benchmark.py --sizes 100 1000 5000 --runs 20 --json bench.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from excel_data_loader import ExcelDataLoader, score_candidates
+from instrumentation import configure_logging, export_otel_json, metrics
+from llm_replay import ReplayChatModel
+from redis_memory import RedisMemory
+
+
+FIRST_NAMES = ["Ava", "Ben", "Chen", "Diya", "Eli", "Fatima", "Gus", "Hana", "Ivan", "Jo",
+               "Kofi", "Lena", "Mateo", "Nia", "Omar", "Priya", "Quinn", "Rosa", "Sam", "Tariq"]
+LAST_NAMES = ["Adams", "Bose", "Cruz", "Diaz", "Evans", "Fox", "Gupta", "Hale", "Ito", "Jones",
+              "Khan", "Lopez", "Mori", "Nair", "Okafor", "Park", "Reyes", "Singh", "Tran", "Wu"]
+TITLES = ["Senior Backend Engineer", "ML Engineer", "Product Manager", "Principal Data Scientist",
+          "Frontend Engineer", "DevOps Engineer", "Product Designer", "Associate Marketing Manager",
+          "Director of Sales", "Full Stack Engineer | Startups", "Junior AI Researcher",
+          "Senior Product Manager, AI Platform"]
+DEPARTMENTS = ["Engineering", "Product", "Design", "Marketing", "Sales", "Data", "Research",
+               "Operations", "Healthcare", "Finance"]
+HEADLINES = ["Building GenAI tools for clinicians", "Fraud detection at scale", "FinTech infra nerd",
+             "B2B SaaS growth", "Machine learning for climate", "Shipping products people love"]
+CITIES = [("San Francisco", "California"), ("Seattle", "Washington"), ("Austin", "Texas"),
+          ("New York", "New York"), ("Boston", "Massachusetts")]
+
+# Vocabulary the loader derives from titles/departments, used for profiles
+PROFILE_SKILLS = ["Machine Learning", "AI", "Backend", "Frontend", "Design", "DevOps",
+                  "Data Science", "Product Management", "Engineering"]
+PROFILE_INTERESTS = ["Engineering", "Product", "Healthcare", "Finance", "Research", "FinTech", "SaaS"]
+PROFILE_ROLES = ["ML Engineer", "Product Manager", "Frontend Engineer", "DevOps Engineer"]
+
+
+def generate_roster_rows(size: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Generate synthetic rows with the same columns as the lessie_export person_list sheet"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(size):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i + 1}"
+        city, state = rng.choice(CITIES)
+        review = [{"keypoint": "Relevant experience", "reason": "Has shipped similar products"}]
+        rows.append({
+            "Name": name,
+            "Title": rng.choice(TITLES),
+            "Company": f"Company {rng.randint(1, max(1, size // 5))}",
+            "Departments": ", ".join(rng.sample(DEPARTMENTS, rng.randint(1, 3))),
+            "Headline": rng.choice(HEADLINES),
+            "City": city,
+            "State": state,
+            "Country/Region": "United States",
+            "Individual email": f"person{i + 1}@example.com",
+            "Profile Link": f"https://www.linkedin.com/in/person{i + 1}",
+            "Review": str(review),
+            "Review Result": rng.choice(["Qualified", "Not Qualified"])
+        })
+    return rows
+
+
+def write_roster(rows: List[Dict[str, Any]], path: str) -> str:
+    """Write synthetic rows to an Excel file ExcelDataLoader can read"""
+    pd.DataFrame(rows).to_excel(path, sheet_name="person_list", index=False)
+    return path
+
+
+def generate_profiles(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Generate synthetic user profiles in the shape match_person expects"""
+    rng = random.Random(seed)
+    return [{
+        "name": f"Bench User {i + 1}",
+        "skills": rng.sample(PROFILE_SKILLS, 2),
+        "interests": rng.sample(PROFILE_INTERESTS, 2),
+        "experience_level": rng.choice(["beginner", "intermediate", "advanced"]),
+        "role_preferences": rng.sample(PROFILE_ROLES, 1),
+        "preferences": "Looking for complementary teammates to ship a demo"
+    } for i in range(count)]
+
+
+def scripted_transcript(people: List[Dict[str, Any]], profiles: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """
+    Build one replay session per profile, mimicking a typical recorded run:
+    skill + interest search, then role search, a full roster dump, a repeated
+    skill search and a team fit check, then a final JSON-lines answer.
+    """
+    sessions = []
+    for n, profile in enumerate(profiles):
+        skill = profile["skills"][0]
+        interest = profile["interests"][0]
+        role = profile["role_preferences"][0]
+        picks = [p for p in people if skill in p["skills"]][:3] or people[:3]
+        names = [p["name"] for p in picks]
+        answer = "\n".join(json.dumps({
+            "id": p["id"],
+            "name": p["name"],
+            "reason": f"Brings {', '.join(p['skills'][:2])} to the team",
+            "score": 90 - 5 * i
+        }) for i, p in enumerate(picks))
+        sessions.append([
+            {"content": "", "tool_calls": [
+                {"name": "search_people_by_skill", "args": {"skill": skill}, "id": f"s{n}_1"},
+                {"name": "search_people_by_interest", "args": {"interest": interest}, "id": f"s{n}_2"}
+            ]},
+            {"content": "", "tool_calls": [
+                {"name": "search_people_by_role", "args": {"role": role}, "id": f"s{n}_3"},
+                {"name": "get_all_people", "args": {}, "id": f"s{n}_4"},
+                {"name": "search_people_by_skill", "args": {"skill": skill}, "id": f"s{n}_5"},
+                {"name": "calculate_team_fit",
+                 "args": {"people_names": names, "preferences": profile["preferences"]}, "id": f"s{n}_6"}
+            ]},
+            {"content": answer, "tool_calls": []}
+        ])
+    return sessions
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def measure(fn: Callable[[], Any], runs: int, memory_runs: int = 1) -> Dict[str, Any]:
+    """
+    Time fn over several runs, then track peak traced memory over a separate
+    pass. tracemalloc slows allocation-heavy code down several times, so it
+    must not be running while latency is timed.
+    """
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    for _ in range(memory_runs):
+        fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "runs": runs,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "peak_kb": round(peak / 1024, 1)
+    }
+
+
+def bench_loader(path: str, runs: int) -> Dict[str, Any]:
+    """Benchmark ExcelDataLoader parsing"""
+    return measure(lambda: ExcelDataLoader(path), runs)
+
+
+def bench_tools(agent_module, profiles: List[Dict[str, Any]], runs: int) -> Dict[str, Dict[str, Any]]:
+    """Benchmark each tool directly, including the size of its serialized output"""
+    people = agent_module.PEOPLE_DATA
+    profile = profiles[0]
+    cases = {
+        "search_people_by_skill": {"skill": profile["skills"][0]},
+        "search_people_by_interest": {"interest": profile["interests"][0]},
+        "search_people_by_role": {"role": profile["role_preferences"][0]},
+        "get_all_people": {},
+        "calculate_team_fit": {"people_names": [p["name"] for p in people[:3]],
+                               "preferences": profile["preferences"]}
+    }
+    results = {}
+    tools = {name: getattr(agent_module, name) for name in cases}
+    for name, args in cases.items():
+        output = tools[name].invoke(args)
+        serialized = json.dumps(output) if isinstance(output, (dict, list)) else str(output)
+        stats = measure(lambda: tools[name].invoke(args), runs)
+        stats["output_bytes"] = len(serialized.encode("utf-8"))
+        results[name] = stats
+    return results
+
+
+def bench_match(agent_module, profiles: List[Dict[str, Any]], transcript: Optional[str],
+                use_shortlists: bool = False, enough_candidates: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Benchmark a full match end to end with a replayed model, optionally from
+    precomputed shortlists. ToolMessage sizes are taken from the agent's
+    tool_end events, i.e. every tool result the agent produced, whether or not
+    it was sent back to the model (early exit answers from a fresh prompt).
+    enough_candidates=inf turns early exit off.
+    """
+    if transcript:
+        llm = ReplayChatModel.from_file(transcript)
+    else:
+        llm = ReplayChatModel(scripted_transcript(agent_module.PEOPLE_DATA, profiles))
+    if enough_candidates is None:
+        enough_candidates = agent_module.ENOUGH_CANDIDATES
+    agent = agent_module.HackathonMatchingAgent(llm=llm, enough_candidates=enough_candidates)
+
+    queue = itertools.cycle(profiles)
+    successes = []
+    iterations = []
+    tool_bytes = []
+
+    shortlists = {}
+    if use_shortlists:
+        for profile in profiles:
+            shortlists[profile["name"]] = [person_id for person_id, _ in score_candidates(
+                profile, agent_module.PEOPLE_INDEX, agent_module.MAX_ANSWER_CANDIDATES)]
+
+    def run_one():
+        profile = next(queue)
+        for event in agent.stream_match(profile, shortlist=shortlists.get(profile["name"])):
+            if event["type"] == "tool_end":
+                tool_bytes.append(event["bytes"])
+            elif event["type"] == "final":
+                successes.append(event["success"])
+                iterations.append(event["iterations"])
+
+    stats = measure(run_one, len(profiles))
+    matches = max(1, len(successes))
+    sessions = max(1, llm.stats["sessions"])
+    stats.update({
+        "success_rate": round(sum(successes) / len(successes), 3) if successes else 0.0,
+        "llm_calls_per_match": round(llm.stats["invocations"] / sessions, 2),
+        "iterations_p95": percentile(iterations, 95),
+        "tool_calls_per_match": round(llm.stats["tool_calls"] / sessions, 2),
+        "tool_messages_per_match": round(len(tool_bytes) / matches, 2),
+        "tool_message_bytes_mean": round(statistics.mean(tool_bytes), 1) if tool_bytes else 0.0,
+        "tool_message_bytes_p95": percentile(tool_bytes, 95),
+        "tool_message_bytes_per_match": round(sum(tool_bytes) / matches, 1),
+        # Tool results that went back to the model as ToolMessages, not just produced
+        "tool_message_bytes_to_model_per_match": round(sum(llm.stats["tool_message_bytes"]) / sessions, 1),
+        "prompt_bytes_per_match": round(llm.stats["input_bytes"] / sessions, 1)
+    })
+    return stats
+
+
+def bench_stream(agent_module, profiles: List[Dict[str, Any]], transcript: Optional[str]) -> Dict[str, Any]:
+    """Benchmark stream_match: time to first event and first token versus total time"""
+    if transcript:
+        llm = ReplayChatModel.from_file(transcript)
+    else:
+        llm = ReplayChatModel(scripted_transcript(agent_module.PEOPLE_DATA, profiles))
+    agent = agent_module.HackathonMatchingAgent(llm=llm)
+
+    queue = itertools.cycle(profiles)
+    first_event, first_token = [], []
+
+    def run_one():
+        start = time.perf_counter()
+        seen_event = seen_token = False
+        for event in agent.stream_match(next(queue)):
+            elapsed = (time.perf_counter() - start) * 1000
+            if not seen_event:
+                first_event.append(elapsed)
+                seen_event = True
+            if event["type"] == "token" and not seen_token:
+                first_token.append(elapsed)
+                seen_token = True
+
+    stats = measure(run_one, len(profiles))
+    stats.update({
+        "first_event_p50_ms": round(percentile(first_event, 50), 3),
+        "first_token_p50_ms": round(percentile(first_token, 50), 3)
+    })
+    return stats
+
+
+def connect_memory(host: str, port: int) -> Optional[RedisMemory]:
+    """Use a live Redis if reachable, else fakeredis if installed, else None"""
+    memory = RedisMemory(host=host, port=port, db=15)
+    if memory.redis_client:
+        return memory
+    try:
+        import fakeredis
+    except ImportError:
+        return None
+    return RedisMemory(client=fakeredis.FakeRedis(decode_responses=True))
+
+
+def bench_redis(memory: RedisMemory, profiles: List[Dict[str, Any]], runs: int) -> Dict[str, Dict[str, Any]]:
+    """Benchmark RedisMemory profile and match history round trips"""
+    usernames = [f"bench_user_{i}" for i in range(len(profiles))]
+    answer = "1. Someone (Engineer) - Great fit\n" * 3
+    counter = iter(range(10 ** 9))
+
+    def save_profile():
+        i = next(counter) % len(profiles)
+        memory.save_user_profile(usernames[i], dict(profiles[i]))
+
+    def get_profile():
+        memory.get_user_profile(usernames[next(counter) % len(profiles)])
+
+    def save_match():
+        memory.save_match_result(usernames[next(counter) % len(profiles)], answer, "bench")
+
+    def get_history():
+        memory.get_match_history(usernames[next(counter) % len(profiles)], limit=10)
+
+    shortlist = [(person_id, float(100 - person_id)) for person_id in range(1, 21)]
+
+    def save_shortlist():
+        memory.save_shortlist(f"user:{usernames[next(counter) % len(profiles)]}", "bench", "bench", shortlist)
+
+    def get_shortlist():
+        memory.get_shortlist(f"user:{usernames[next(counter) % len(profiles)]}", "bench", "bench", limit=20)
+
+    try:
+        return {
+            "save_user_profile": measure(save_profile, runs),
+            "get_user_profile": measure(get_profile, runs),
+            "save_match_result": measure(save_match, runs),
+            "get_match_history": measure(get_history, runs),
+            "save_shortlist": measure(save_shortlist, runs),
+            "get_shortlist": measure(get_shortlist, runs)
+        }
+    finally:
+        for username in usernames:
+            memory.delete_user_profile(username)
+            memory.redis_client.delete(f"shortlist:bench:user:{username}:bench")
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """Print benchmark results as a compact table"""
+    for size, sections in report["sizes"].items():
+        print("\n" + "=" * 60)
+        print(f"Roster size: {size}")
+        print("=" * 60)
+        for section, rows in sections.items():
+            if not rows:
+                print(f"\n[{section}] skipped")
+                continue
+            print(f"\n[{section}]")
+            if "p50_ms" in rows:
+                rows = {section: rows}
+            for name, stats in rows.items():
+                extras = ", ".join(f"{k}={v}" for k, v in stats.items()
+                                   if k not in ("runs", "p50_ms", "p95_ms", "peak_kb"))
+                print(f"  {name:28s} p50={stats['p50_ms']:>9.3f}ms  p95={stats['p95_ms']:>9.3f}ms  "
+                      f"peak={stats['peak_kb']:>9.1f}KB" + (f"  {extras}" if extras else ""))
+
+
+def main():
+    """Run the benchmark suite"""
+    parser = argparse.ArgumentParser(description="Offline benchmark for the hackathon matching agent")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000],
+                        help="Synthetic roster sizes to benchmark")
+    parser.add_argument("--runs", type=int, default=20, help="Runs per tool/Redis benchmark")
+    parser.add_argument("--matches", type=int, default=20, help="match_person calls per roster size")
+    parser.add_argument("--loader-runs", type=int, default=3, help="ExcelDataLoader parses per roster size")
+    parser.add_argument("--transcript", help="Replay a recorded transcript instead of the scripted one")
+    parser.add_argument("--enough-candidates", type=float, default=None,
+                        help="Distinct candidates that end the tool search early (default: the agent's "
+                             "ENOUGH_CANDIDATES; 'inf' turns early exit off)")
+    parser.add_argument("--redis-host", default=os.getenv("REDIS_HOST", "localhost"))
+    parser.add_argument("--redis-port", type=int, default=int(os.getenv("REDIS_PORT", "6379")))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the report to this JSON file")
+    parser.add_argument("--metrics", help="Write per-stage Prometheus metrics to this file")
+    parser.add_argument("--traces", help="Write recorded spans as OTLP JSON to this file")
+    args = parser.parse_args()
+    configure_logging(os.getenv("LOG_LEVEL", "WARNING"))
+
+    profiles = generate_profiles(args.matches, seed=args.seed)
+    memory = connect_memory(args.redis_host, args.redis_port)
+    report = {"config": vars(args), "sizes": {}}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {size: write_roster(generate_roster_rows(size, seed=args.seed),
+                                    os.path.join(tmp, f"roster_{size}.xlsx"))
+                 for size in args.sizes}
+
+        # agent_new loads its roster at import time; point it at a synthetic one
+        os.environ["ROSTER_PATH"] = paths[args.sizes[0]]
+        import agent_new
+
+        for size in args.sizes:
+            agent_new.set_people_data(ExcelDataLoader(paths[size]).get_all_people())
+            report["sizes"][size] = {
+                "loader": bench_loader(paths[size], args.loader_runs),
+                "tools": bench_tools(agent_new, profiles, args.runs),
+                "match_person": bench_match(agent_new, profiles, args.transcript,
+                                            enough_candidates=args.enough_candidates),
+                "match_person_shortlist": bench_match(agent_new, profiles, args.transcript, use_shortlists=True,
+                                                      enough_candidates=args.enough_candidates),
+                "stream_match": bench_stream(agent_new, profiles, args.transcript),
+                "redis": bench_redis(memory, profiles, args.runs) if memory else {}
+            }
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report written to {args.json}")
+    if args.metrics:
+        with open(args.metrics, "w") as f:
+            f.write(metrics.to_prometheus())
+        print(f"💾 Metrics written to {args.metrics}")
+    if args.traces:
+        with open(args.traces, "w") as f:
+            json.dump(export_otel_json(), f)
+        print(f"💾 Traces written to {args.traces}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,83 @@
 """Load people data from Excel (lessie_export.xlsx)"""
 
 import pandas as pd
+import hashlib
 import json
-from typing import List, Dict, Any
+import logging
+import re
+from typing import List, Dict, Any, Optional, Tuple
+from instrumentation import span
+
+
+logger = logging.getLogger(__name__)
+
+# Stand-in skill for people whose title and headline name no skill
+PLACEHOLDER_SKILL = 'General'
+# Points per overlapping attribute
+SKILL_WEIGHT = 3.0
+INTEREST_WEIGHT = 2.0
+ROLE_WEIGHT = 2.0
+# A skill named in the free-text "preferences" is what the user is looking for
+WANTED_SKILL_WEIGHT = 4.0
+
+
+def build_people_index(people: List[Dict[str, Any]]) -> Dict[str, Dict]:
+    """
+    Index people by lowercased skill, interest and role so searches are dict
+    lookups instead of roster scans. Lists keep roster order. Also maps id
+    and lowercased name to the person.
+    """
+    index = {"skills": {}, "interests": {}, "role_preferences": {}}
+    for person in people:
+        for field, lookup in index.items():
+            for value in dict.fromkeys(v.lower() for v in person[field]):
+                lookup.setdefault(value, []).append(person)
+    index["id"] = {person["id"]: person for person in people}
+    index["name"] = {str(person["name"]).lower(): person for person in reversed(people)}
+    return index
+
+
+def _lower_set(values) -> set:
+    return {str(v).lower() for v in values or []}
+
+
+def score_candidates(profile: Dict[str, Any], index: Dict[str, Dict], top_k: int,
+                     exclude_id: Optional[int] = None) -> List[Tuple[int, float]]:
+    """
+    Rank roster people for a profile by attribute overlap. Only people that
+    share at least one skill, interest or role (or have a skill the profile's
+    preferences ask for) are scored, using the roster index.
+    """
+    skills = _lower_set(profile.get("skills"))
+    interests = _lower_set(profile.get("interests"))
+    roles = _lower_set(profile.get("role_preferences"))
+    wanted_text = str(profile.get("preferences", "")).lower()
+    # The placeholder would match ordinary words ("in general") and reward people with no skills
+    searchable = (skill for skill in index["skills"] if skill and skill != PLACEHOLDER_SKILL.lower())
+    wanted = {skill for skill in searchable if re.search(rf"\b{re.escape(skill)}\b", wanted_text)}
+
+    scores: Dict[int, float] = {}
+    for field, values, weight in (("skills", skills, SKILL_WEIGHT),
+                                  ("interests", interests, INTEREST_WEIGHT),
+                                  ("role_preferences", roles, ROLE_WEIGHT),
+                                  ("skills", wanted, WANTED_SKILL_WEIGHT)):
+        for value in values:
+            for person in index[field].get(value, []):
+                scores[person["id"]] = scores.get(person["id"], 0.0) + weight
+
+    name = str(profile.get("name", "")).lower()
+    ranked = sorted(
+        ((person_id, score) for person_id, score in scores.items()
+         if person_id != exclude_id and str(index["id"][person_id]["name"]).lower() != name),
+        key=lambda item: (-item[1], item[0])
+    )
+    return ranked[:top_k]
+
+
+def roster_version(people: List[Dict[str, Any]]) -> str:
+    """Short content hash of a roster, so data derived from it can be versioned"""
+    payload = json.dumps(people, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(payload).hexdigest()[:12]
 
 
 class ExcelDataLoader:
@@ -11,7 +86,9 @@ class ExcelDataLoader:
     def __init__(self, file_path: str = "../lessie_export.xlsx"):
         """Initialize with path to Excel file"""
         self.file_path = file_path
-        self.people = self._load_data()
+        with span("loader.parse", path=file_path) as parse_span:
+            self.people = self._load_data()
+            parse_span.set_attribute("people", len(self.people))
     
     def _load_data(self) -> List[Dict[str, Any]]:
         """Load people data from Excel file and convert to JSON-like format"""
@@ -83,7 +160,7 @@ class ExcelDataLoader:
                 experience_level = 'beginner'
             
             # Deduplicate
-            skills = list(dict.fromkeys(skills)) if skills else ['General']
+            skills = list(dict.fromkeys(skills)) if skills else [PLACEHOLDER_SKILL]
             interests = list(dict.fromkeys(interests)) if interests else ['Technology']
             
             # Create person object
@@ -110,7 +187,7 @@ class ExcelDataLoader:
             
             people.append(person)
         
-        print(f"✓ Loaded {len(people)} people from {self.file_path}")
+        logger.info("Loaded people", extra={"count": len(people), "path": self.file_path})
         return people
     
     def get_all_people(self) -> List[Dict[str, Any]]:
@@ -0,0 +1,444 @@
+"""Lightweight tracing, metrics and structured logging for the matching agent"""
+
+import contextvars
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Generator, Iterator, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from fast Redis calls up to slow LLM turns
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Span attributes that become metric labels (everything else stays on the span only)
+LABEL_KEYS = ("tool", "command", "status")
+METRIC_PREFIX = "meetmatch_"
+
+
+class Histogram:
+    """Cumulative histogram in the Prometheus sense"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Record one observation"""
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class MetricsRegistry:
+    """Thread-safe store of histograms and counters keyed by name and labels"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram] = {}
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, Any]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **labels) -> None:
+        """Add an observation to a histogram"""
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """Increment a counter"""
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def reset(self) -> None:
+        """Drop all recorded metrics"""
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def to_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        def fmt_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            seen = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                metric = METRIC_PREFIX + name
+                if metric not in seen:
+                    lines.append(f"# TYPE {metric} counter")
+                    seen.add(metric)
+                lines.append(f"{metric}{fmt_labels(labels)} {value}")
+
+            for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                metric = METRIC_PREFIX + name
+                if metric not in seen:
+                    lines.append(f"# TYPE {metric} histogram")
+                    seen.add(metric)
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f"{metric}_bucket{fmt_labels(labels, [('le', bound)])} {count}")
+                lines.append(f"{metric}_bucket{fmt_labels(labels, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{metric}_sum{fmt_labels(labels)} {histogram.sum}")
+                lines.append(f"{metric}_count{fmt_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Span:
+    """A timed unit of work, exported in OpenTelemetry (OTLP/JSON) shape"""
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = "ok"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """Attach an attribute after the span has started"""
+        self.attributes[key] = value
+
+    def to_otel(self) -> Dict[str, Any]:
+        """Convert to an OTLP/JSON span"""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [_otel_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2 if self.status == "error" else 1}
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otel_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+metrics = MetricsRegistry()
+finished_spans: deque = deque(maxlen=int(os.getenv("TRACE_BUFFER_SIZE", "2000")))
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+def _start_span(name: str, attributes: Dict[str, Any]) -> Span:
+    parent = _current_span.get()
+    return Span(
+        name,
+        trace_id=parent.trace_id if parent else secrets.token_hex(16),
+        parent_id=parent.span_id if parent else None,
+        attributes=attributes
+    )
+
+
+def _finish_span(current: Span, duration: float, wall: Optional[float] = None) -> None:
+    current.end_ns = current.start_ns + int((duration if wall is None else wall) * 1e9)
+    finished_spans.append(current)
+    labels = {k: v for k, v in current.attributes.items() if k in LABEL_KEYS}
+    labels["status"] = current.status
+    metrics.observe("span_duration_seconds", duration, span=current.name, **labels)
+    logger.debug("span finished", extra={"span": current.name, "duration_ms": round(duration * 1000, 3),
+                                         "attributes": current.attributes})
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """
+    Time a block of work as a span and record it in the span_duration_seconds
+    histogram. Nested spans share the trace of their parent.
+
+        with span("tool.invoke", tool="get_all_people"):
+            ...
+
+    Don't yield from a generator inside this block; use span_generator.
+    """
+    current = _start_span(name, attributes)
+    token = _current_span.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException:
+        current.status = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        _current_span.reset(token)
+        _finish_span(current, duration)
+
+
+def span_generator(name: str, generator: Generator, **attributes) -> Generator:
+    """
+    Trace a generator as one span and pass through its items and return value.
+
+    The span is only current while the generator itself runs, not while the
+    consumer handles an item, so spans opened by the consumer don't nest under
+    it and its duration excludes consumer time (the wall time still sets the
+    exported end time, with the difference in consumer_wait_ms). Closing it
+    early, e.g. a consumer that stops after the item it needed, finishes the
+    span normally.
+
+        result = yield from span_generator("llm.invoke", stream_chunks())
+    """
+    current = _start_span(name, attributes)
+    wall_start = time.perf_counter()
+    busy = 0.0
+
+    def step(fn, *args):
+        nonlocal busy
+        token = _current_span.set(current)
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            busy += time.perf_counter() - start
+            _current_span.reset(token)
+
+    try:
+        while True:
+            try:
+                item = step(next, generator)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                yield item
+            except GeneratorExit:
+                step(generator.close)
+                raise
+    except GeneratorExit:
+        raise
+    except BaseException:
+        current.status = "error"
+        raise
+    finally:
+        wall = time.perf_counter() - wall_start
+        current.set_attribute("consumer_wait_ms", round((wall - busy) * 1000, 3))
+        _finish_span(current, busy, wall)
+
+
+def export_otel_json(spans: Optional[List[Span]] = None, service_name: str = "meetmatch") -> Dict[str, Any]:
+    """Export finished spans as an OTLP/JSON ExportTraceServiceRequest"""
+    spans = list(finished_spans) if spans is None else spans
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_otel_attribute("service.name", service_name)]},
+            "scopeSpans": [{
+                "scope": {"name": "meetmatch.instrumentation"},
+                "spans": [s.to_otel() for s in spans]
+            }]
+        }]
+    }
+
+
+class _InstrumentedRedis:
+    """Proxy around a redis client that wraps every command in a span"""
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._client, name)
+        if not callable(attr) or name.startswith("_"):
+            return attr
+        if name == "pipeline":
+            return lambda *args, **kwargs: _InstrumentedPipeline(attr(*args, **kwargs))
+
+        def command(*args, **kwargs):
+            with span("redis.command", command=name):
+                return attr(*args, **kwargs)
+        return command
+
+
+class _InstrumentedPipeline:
+    """Proxy around a redis pipeline that traces execute(), where its commands actually run"""
+
+    def __init__(self, pipeline):
+        self._pipeline = pipeline
+
+    def __getattr__(self, name: str):
+        return getattr(self._pipeline, name)
+
+    def __enter__(self) -> "_InstrumentedPipeline":
+        self._pipeline.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._pipeline.__exit__(*exc_info)
+
+    def execute(self, *args, **kwargs):
+        with span("redis.command", command="pipeline",
+                  commands=len(getattr(self._pipeline, "command_stack", []))):
+            return self._pipeline.execute(*args, **kwargs)
+
+
+def instrument_redis(client):
+    """Wrap a redis client so each command is traced (None passes through)"""
+    return _InstrumentedRedis(client) if client is not None else None
+
+
+@contextmanager
+def profiled(name: str) -> Iterator[None]:
+    """
+    Optionally profile a hot path, controlled by the PROFILER env var:
+    "cprofile" writes a .prof file, "pyinstrument" writes an HTML report,
+    both into PROFILE_DIR (default: profiles/). Unset means no overhead.
+    """
+    mode = os.getenv("PROFILER", "").lower()
+    if mode not in ("cprofile", "pyinstrument"):
+        yield
+        return
+
+    out_dir = os.getenv("PROFILE_DIR", "profiles")
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+
+    if mode == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            path = os.path.join(out_dir, f"{name}-{stamp}.prof")
+            profiler.dump_stats(path)
+            logger.info("profile written", extra={"path": path})
+        return
+
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        logger.warning("PROFILER=pyinstrument but pyinstrument is not installed")
+        yield
+        return
+    profiler = Profiler()
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        path = os.path.join(out_dir, f"{name}-{stamp}.html")
+        with open(path, "w") as f:
+            f.write(profiler.output_html())
+        logger.info("profile written", extra={"path": path})
+
+
+# Attributes every LogRecord has; anything else came from `extra=` and is structured data
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def _record_fields(record: logging.LogRecord) -> Dict[str, Any]:
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per log line, including any `extra=` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **_record_fields(record)
+        }
+        span_ctx = _current_span.get()
+        if span_ctx:
+            entry["trace_id"] = span_ctx.trace_id
+            entry["span_id"] = span_ctx.span_id
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Human-readable lines with structured fields appended as key=value"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = f"{record.levelname:<7} {record.name}: {record.getMessage()}"
+        fields = _record_fields(record)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None) -> None:
+    """
+    Configure root logging from arguments or LOG_LEVEL (default INFO) and
+    LOG_FORMAT ("text" or "json", default text)
+    """
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.getenv("LOG_FORMAT", "text")).lower()
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if fmt == "json" else KeyValueFormatter())
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] == "/metrics":
+            body = metrics.to_prometheus().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path.split("?")[0] == "/traces":
+            body = json.dumps(export_otel_json()).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics request", extra={"client": self.address_string(), "request": format % args})
+
+
+def start_metrics_server(port: int = 9464, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve /metrics (Prometheus text) and /traces (OTLP JSON) from a daemon thread"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    logger.info("metrics server started", extra={"host": host, "port": port})
+    return server
@@ -0,0 +1,182 @@
+"""Record/replay chat models for running the matching agent offline"""
+
+import json
+import re
+from typing import Any, Dict, Iterator, List, Optional
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, ToolMessage
+
+
+def _turn_index(messages: List[BaseMessage]) -> int:
+    """Number of model turns already in the conversation"""
+    return sum(1 for m in messages if isinstance(m, AIMessage))
+
+
+def _message_to_turn(message: BaseMessage) -> Dict[str, Any]:
+    """Convert a model response into a JSON-serializable transcript turn"""
+    return {
+        "content": message.content,
+        "tool_calls": [
+            {"name": tc["name"], "args": tc["args"], "id": tc.get("id")}
+            for tc in getattr(message, "tool_calls", None) or []
+        ]
+    }
+
+
+class ReplayChatModel:
+    """
+    Fake chat model that replays recorded tool-call transcripts.
+
+    A transcript is {"sessions": [[turn, ...], ...]} where each turn is
+    {"content": str, "tool_calls": [{"name", "args", "id"}]}. For the
+    tool-bound model the turn to replay is picked from the number of AI
+    messages already in the conversation, so every new match_person call
+    starts a session from the top; sessions are handed out round-robin.
+    The unbound model cannot call tools, so it replays the next turn of the
+    current session that has no tool calls, starting the next session when
+    the current one has none left.
+    """
+
+    def __init__(self, sessions: List[List[Dict[str, Any]]], parent: Optional["ReplayChatModel"] = None):
+        if not sessions or not all(sessions):
+            raise ValueError("Transcript must contain at least one non-empty session")
+        self.sessions = sessions
+        self.tools = []
+        self._parent = parent
+        self._next_session = 0
+        self._current: Optional[List[Dict[str, Any]]] = None
+        self._cursor = 0
+        # Bound copies share the parent's stats so they cover the whole run
+        if parent is not None:
+            self.stats = parent.stats
+        else:
+            self.stats = {}
+            self.reset_stats()
+
+    @classmethod
+    def from_file(cls, path: str) -> "ReplayChatModel":
+        """Load a transcript written by RecordingChatModel.save"""
+        with open(path) as f:
+            return cls(json.load(f)["sessions"])
+
+    def reset_stats(self) -> None:
+        """Clear invocation counters"""
+        self.stats.clear()
+        self.stats.update({
+            "invocations": 0,
+            "sessions": 0,
+            "tool_calls": 0,
+            "tool_messages": 0,
+            "tool_message_bytes": [],
+            "input_bytes": 0
+        })
+
+    def bind_tools(self, tools: list) -> "ReplayChatModel":
+        """Return a copy that reports the given tools (sharing transcript and stats)"""
+        bound = ReplayChatModel(self.sessions, parent=self._root())
+        bound.tools = list(tools)
+        return bound
+
+    def _root(self) -> "ReplayChatModel":
+        return self._parent if self._parent is not None else self
+
+    def _start_session(self) -> None:
+        self._current = self.sessions[self._next_session % len(self.sessions)]
+        self._next_session += 1
+        self._cursor = 0
+        self.stats["sessions"] += 1
+
+    def _next_plain_turn(self, start: int) -> Optional[int]:
+        """Index of the first turn without tool calls at or after start in the current session"""
+        if self._current is None:
+            return None
+        return next((i for i in range(start, len(self._current)) if not self._current[i]["tool_calls"]), None)
+
+    def _next_turn(self, messages: List[BaseMessage]) -> Dict[str, Any]:
+        """Pick the turn that answers these messages and update stats"""
+        root = self._root()
+        if self._parent is None:
+            index = root._next_plain_turn(root._cursor)
+            if index is None:
+                root._start_session()
+                index = root._next_plain_turn(0)
+                if index is None:
+                    index = len(root._current) - 1
+        else:
+            index = _turn_index(messages)
+            if index == 0 or root._current is None:
+                root._start_session()
+            index = min(index, len(root._current) - 1)
+        session = root._current
+        root._cursor = index + 1
+
+        # Tool results sent back since the previous model turn
+        for msg in reversed(messages):
+            if isinstance(msg, AIMessage):
+                break
+            if isinstance(msg, ToolMessage):
+                self.stats["tool_messages"] += 1
+                self.stats["tool_message_bytes"].append(len(str(msg.content).encode("utf-8")))
+
+        turn = session[index]
+        self.stats["invocations"] += 1
+        self.stats["input_bytes"] += sum(len(str(m.content).encode("utf-8")) for m in messages)
+        self.stats["tool_calls"] += len(turn["tool_calls"])
+        return turn
+
+    def invoke(self, messages: List[BaseMessage], *args, **kwargs) -> AIMessage:
+        """Return the next recorded turn as an AIMessage"""
+        turn = self._next_turn(messages)
+        return AIMessage(content=turn["content"], tool_calls=list(turn["tool_calls"]))
+
+    def stream(self, messages: List[BaseMessage], *args, **kwargs) -> Iterator[AIMessageChunk]:
+        """Replay the next turn as word-sized chunks, with tool calls in the last chunk"""
+        turn = self._next_turn(messages)
+        content = turn["content"]
+        if isinstance(content, str):
+            for piece in re.findall(r"\s*\S+\s*", content):
+                yield AIMessageChunk(content=piece)
+        else:
+            yield AIMessageChunk(content=content)
+        if turn["tool_calls"]:
+            yield AIMessageChunk(content="", tool_call_chunks=[
+                {"name": tc["name"], "args": json.dumps(tc["args"]), "id": tc["id"], "index": i}
+                for i, tc in enumerate(turn["tool_calls"])
+            ])
+
+
+class RecordingChatModel:
+    """Wrap a real chat model and record its responses as a replayable transcript"""
+
+    def __init__(self, llm, sessions: Optional[List[List[Dict[str, Any]]]] = None, bound: bool = False):
+        self.llm = llm
+        self.sessions = sessions if sessions is not None else []
+        self.bound = bound
+
+    def bind_tools(self, tools: list) -> "RecordingChatModel":
+        """Bind tools on the wrapped model, recording into the same transcript"""
+        return RecordingChatModel(self.llm.bind_tools(tools), sessions=self.sessions, bound=True)
+
+    def invoke(self, messages: List[BaseMessage], *args, **kwargs) -> AIMessage:
+        """Call the wrapped model and record the response"""
+        response = self.llm.invoke(messages, *args, **kwargs)
+        self._record(messages, response)
+        return response
+
+    def stream(self, messages: List[BaseMessage], *args, **kwargs) -> Iterator[AIMessageChunk]:
+        """Stream from the wrapped model and record the assembled response"""
+        full = None
+        for chunk in self.llm.stream(messages, *args, **kwargs):
+            full = chunk if full is None else full + chunk
+            yield chunk
+        self._record(messages, full if full is not None else AIMessage(content=""))
+
+    def _record(self, messages: List[BaseMessage], response: BaseMessage) -> None:
+        # Unbound calls (e.g. the final answer) belong to the current session
+        if (self.bound and _turn_index(messages) == 0) or not self.sessions:
+            self.sessions.append([])
+        self.sessions[-1].append(_message_to_turn(response))
+
+    def save(self, path: str) -> None:
+        """Write the recorded transcript to a JSON file"""
+        with open(path, "w") as f:
+            json.dump({"sessions": self.sessions}, f, indent=2)
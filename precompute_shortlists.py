@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Batch job: precompute top-K candidate shortlists into Redis
+
+Scores every saved profile (and optionally every roster person) against the
+roster with a process pool and stores the result as a Redis sorted set keyed
+by roster version and profile version. A profile is only recomputed when its
+updated_at or the roster changed, i.e. when its key does not exist yet.
+
+    python3 precompute_shortlists.py --top-k 20 --include-roster
+"""
+
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from excel_data_loader import ExcelDataLoader, build_people_index, roster_version, score_candidates
+from instrumentation import configure_logging, span
+from redis_memory import RedisMemory, profile_version
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOP_K = 20
+
+# Roster index for the worker processes, set once per worker by _init_worker
+_INDEX: Optional[Dict[str, Dict]] = None
+
+
+def _init_worker(people: List[Dict[str, Any]]) -> None:
+    """Build the roster index once per worker process"""
+    global _INDEX
+    _INDEX = build_people_index(people)
+
+
+def _compute(job: Tuple[str, str, Dict[str, Any], Optional[int], int]) -> Tuple[str, str, List[Tuple[int, float]]]:
+    owner, version, profile, exclude_id, top_k = job
+    return owner, version, score_candidates(profile, _INDEX, top_k, exclude_id=exclude_id)
+
+
+def collect_jobs(memory: RedisMemory, people: List[Dict[str, Any]], version: str, top_k: int,
+                 include_roster: bool, force: bool) -> Tuple[list, int]:
+    """List (owner, profile version, profile, exclude id, top_k) jobs that need (re)computing"""
+    jobs = []
+    skipped = 0
+    for username in memory.list_all_users():
+        profile = memory.get_user_profile(username)
+        if not profile:
+            continue
+        owner, p_version = f"user:{username}", profile_version(profile)
+        if not force and memory.has_shortlist(owner, version, p_version):
+            skipped += 1
+            continue
+        jobs.append((owner, p_version, profile, None, top_k))
+
+    if include_roster:
+        for person in people:
+            # Roster people only change with the roster itself
+            owner, p_version = f"person:{person['id']}", version
+            if not force and memory.has_shortlist(owner, version, p_version):
+                skipped += 1
+                continue
+            profile = {**person, "preferences": person.get("headline", "")}
+            jobs.append((owner, p_version, profile, person["id"], top_k))
+    return jobs, skipped
+
+
+def precompute(memory: RedisMemory, people: List[Dict[str, Any]], version: str, top_k: int = DEFAULT_TOP_K,
+               workers: Optional[int] = None, include_roster: bool = False, force: bool = False) -> Dict[str, int]:
+    """Compute and store missing shortlists; returns counts of computed and skipped profiles"""
+    with span("shortlists.collect"):
+        jobs, skipped = collect_jobs(memory, people, version, top_k, include_roster, force)
+
+    computed = 0
+    with span("shortlists.compute", jobs=len(jobs)):
+        if workers == 1 or len(jobs) < 2:
+            _init_worker(people)
+            results = map(_compute, jobs)
+            pool = None
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(people,))
+            chunksize = max(1, len(jobs) // ((workers or os.cpu_count() or 1) * 4))
+            results = pool.map(_compute, jobs, chunksize=chunksize)
+        try:
+            for owner, p_version, scores in results:
+                if memory.save_shortlist(owner, version, p_version, scores):
+                    computed += 1
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+    logger.info("Shortlists precomputed", extra={"computed": computed, "skipped": skipped,
+                                                  "roster_version": version})
+    return {"computed": computed, "skipped": skipped}
+
+
+def main():
+    """Run the batch job against the configured roster and Redis"""
+    parser = argparse.ArgumentParser(description="Precompute candidate shortlists into Redis")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K, help="Candidates kept per profile")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--include-roster", action="store_true", help="Also precompute for every roster person")
+    parser.add_argument("--force", action="store_true", help="Recompute even if a current shortlist exists")
+    parser.add_argument("--redis-host", default=os.getenv("REDIS_HOST", "localhost"))
+    parser.add_argument("--redis-port", type=int, default=int(os.getenv("REDIS_PORT", "6379")))
+    args = parser.parse_args()
+
+    configure_logging()
+    # Same roster and version as agent_new, without loading the agent
+    people = ExcelDataLoader(os.getenv("ROSTER_PATH", "../lessie_export.xlsx")).get_all_people()
+    version = roster_version(people)
+
+    memory = RedisMemory(host=args.redis_host, port=args.redis_port)
+    if not memory.redis_client:
+        logger.error("Redis is required to store shortlists",
+                     extra={"host": args.redis_host, "port": args.redis_port})
+        raise SystemExit(1)
+
+    start = time.perf_counter()
+    counts = precompute(memory, people, version, top_k=args.top_k,
+                        workers=args.workers, include_roster=args.include_roster, force=args.force)
+    print(f"✓ Computed {counts['computed']} shortlists, {counts['skipped']} already current "
+          f"(roster {version}, {time.perf_counter() - start:.1f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,52 @@
 """Redis-based memory for storing user profiles and match history"""
 
+import hashlib
 import json
+import logging
 import redis
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
+from instrumentation import instrument_redis
+
+
+logger = logging.getLogger(__name__)
+
+# Shortlists are versioned by key, so stale ones are never read; let them expire
+SHORTLIST_TTL = 30 * 24 * 60 * 60
+# Member stored for an empty shortlist so it still counts as computed
+EMPTY_SHORTLIST_MEMBER = "none"
+
+
+def profile_version(profile: Dict[str, Any]) -> str:
+    """Version of a saved profile, derived from its updated_at timestamp"""
+    return hashlib.sha1(str(profile.get("updated_at", "")).encode("utf-8")).hexdigest()[:12]
+
+
+def shortlist_key(owner: str, roster_version: str, version: str) -> str:
+    """Redis key for a shortlist, e.g. shortlist:<roster>:user:guna:<profile version>"""
+    return f"shortlist:{roster_version}:{owner}:{version}"
 
 
 class RedisMemory:
     """Store and retrieve user profiles and match results using Redis"""
     
-    def __init__(self, host: str = 'localhost', port: int = 6379, db: int = 0):
-        """Initialize Redis connection"""
+    def __init__(self, host: str = 'localhost', port: int = 6379, db: int = 0,
+                 client: Optional[redis.Redis] = None):
+        """Initialize Redis connection (or use an existing client, e.g. fakeredis)"""
         try:
-            self.redis_client = redis.Redis(
+            # Every command goes through a span so Redis time shows up in traces
+            self.redis_client = instrument_redis(client if client is not None else redis.Redis(
                 host=host,
                 port=port,
                 db=db,
                 decode_responses=True
-            )
+            ))
             # Test connection
             self.redis_client.ping()
-            print(f"✓ Connected to Redis at {host}:{port}")
+            logger.info("Connected to Redis", extra={"host": host, "port": port})
         except Exception as e:
-            print(f"⚠ Redis connection failed: {e}")
-            print("  Continuing without Redis memory...")
+            logger.warning("Redis connection failed, continuing without Redis memory",
+                           extra={"host": host, "port": port, "error": str(e)})
             self.redis_client = None
     
     def save_user_profile(self, username: str, profile: Dict[str, Any]) -> bool:
@@ -35,10 +58,10 @@ class RedisMemory:
             key = f"user:{username}"
             profile['updated_at'] = datetime.now().isoformat()
             self.redis_client.set(key, json.dumps(profile))
-            print(f"✓ Saved profile for {username}")
+            logger.info("Saved profile", extra={"username": username})
             return True
         except Exception as e:
-            print(f"✗ Error saving profile: {e}")
+            logger.error("Error saving profile", extra={"username": username, "error": str(e)})
             return False
     
     def get_user_profile(self, username: str) -> Optional[Dict[str, Any]]:
@@ -51,11 +74,11 @@ class RedisMemory:
             data = self.redis_client.get(key)
             if data:
                 profile = json.loads(data)
-                print(f"✓ Retrieved profile for {username}")
+                logger.info("Retrieved profile", extra={"username": username})
                 return profile
             return None
         except Exception as e:
-            print(f"✗ Error retrieving profile: {e}")
+            logger.error("Error retrieving profile", extra={"username": username, "error": str(e)})
             return None
     
     def save_match_result(self, username: str, matches: str, query: str = "") -> bool:
@@ -79,10 +102,10 @@ class RedisMemory:
             # Set expiration to 30 days
             self.redis_client.expire(key, 30 * 24 * 60 * 60)
             
-            print(f"✓ Saved match results for {username}")
+            logger.info("Saved match results", extra={"username": username})
             return True
         except Exception as e:
-            print(f"✗ Error saving matches: {e}")
+            logger.error("Error saving matches", extra={"username": username, "error": str(e)})
             return False
     
     def get_match_history(self, username: str, limit: int = 5) -> List[Dict[str, Any]]:
@@ -96,11 +119,11 @@ class RedisMemory:
             
             if data:
                 results = [json.loads(item) for item in data]
-                print(f"✓ Retrieved {len(results)} match results for {username}")
+                logger.info("Retrieved match history", extra={"username": username, "count": len(results)})
                 return results
             return []
         except Exception as e:
-            print(f"✗ Error retrieving match history: {e}")
+            logger.error("Error retrieving match history", extra={"username": username, "error": str(e)})
             return []
     
     def get_latest_match(self, username: str) -> Optional[Dict[str, Any]]:
@@ -116,7 +139,7 @@ class RedisMemory:
                 return json.loads(data[0])
             return None
         except Exception as e:
-            print(f"✗ Error retrieving latest match: {e}")
+            logger.error("Error retrieving latest match", extra={"username": username, "error": str(e)})
             return None
     
     def update_user_preferences(self, username: str, updates: Dict[str, Any]) -> bool:
@@ -131,7 +154,7 @@ class RedisMemory:
                 return self.save_user_profile(username, profile)
             return False
         except Exception as e:
-            print(f"✗ Error updating preferences: {e}")
+            logger.error("Error updating preferences", extra={"username": username, "error": str(e)})
             return False
     
     def list_all_users(self) -> List[str]:
@@ -144,7 +167,7 @@ class RedisMemory:
             users = [key.replace("user:", "") for key in keys]
             return users
         except Exception as e:
-            print(f"✗ Error listing users: {e}")
+            logger.error("Error listing users", extra={"error": str(e)})
             return []
     
     def delete_user_profile(self, username: str) -> bool:
@@ -155,10 +178,62 @@ class RedisMemory:
         try:
             self.redis_client.delete(f"user:{username}")
             self.redis_client.delete(f"matches:{username}")
-            print(f"✓ Deleted profile for {username}")
+            logger.info("Deleted profile", extra={"username": username})
+            return True
+        except Exception as e:
+            logger.error("Error deleting profile", extra={"username": username, "error": str(e)})
+            return False
+    
+    def save_shortlist(self, owner: str, roster_version: str, version: str,
+                       scores: List[Tuple[int, float]]) -> bool:
+        """
+        Store a precomputed candidate shortlist as a sorted set of person ids.
+        
+        Args:
+            owner: "user:<username>" or "person:<roster id>"
+            roster_version: Version of the roster the scores were computed on
+            version: Version of the owner's profile (see profile_version)
+            scores: (person id, score) pairs
+        """
+        if not self.redis_client:
+            return False
+        
+        try:
+            key = shortlist_key(owner, roster_version, version)
+            mapping = {str(person_id): score for person_id, score in scores} or {EMPTY_SHORTLIST_MEMBER: -1}
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.delete(key)
+            pipe.zadd(key, mapping)
+            pipe.expire(key, SHORTLIST_TTL)
+            pipe.execute()
             return True
         except Exception as e:
-            print(f"✗ Error deleting profile: {e}")
+            logger.error("Error saving shortlist", extra={"owner": owner, "error": str(e)})
+            return False
+    
+    def get_shortlist(self, owner: str, roster_version: str, version: str,
+                      limit: int = 10) -> List[Tuple[int, float]]:
+        """Top (person id, score) pairs of a precomputed shortlist, best first (one ZRANGE)"""
+        if not self.redis_client:
+            return []
+        
+        try:
+            key = shortlist_key(owner, roster_version, version)
+            data = self.redis_client.zrange(key, 0, limit - 1, desc=True, withscores=True)
+            return [(int(member), score) for member, score in data if member != EMPTY_SHORTLIST_MEMBER]
+        except Exception as e:
+            logger.error("Error retrieving shortlist", extra={"owner": owner, "error": str(e)})
+            return []
+    
+    def has_shortlist(self, owner: str, roster_version: str, version: str) -> bool:
+        """Whether a shortlist exists for this owner, roster and profile version"""
+        if not self.redis_client:
+            return False
+        
+        try:
+            return bool(self.redis_client.exists(shortlist_key(owner, roster_version, version)))
+        except Exception as e:
+            logger.error("Error checking shortlist", extra={"owner": owner, "error": str(e)})
             return False
     
     def clear_all(self) -> bool:
@@ -168,8 +243,8 @@ class RedisMemory:
         
         try:
             self.redis_client.flushdb()
-            print("✓ Cleared all data from Redis")
+            logger.info("Cleared all data from Redis")
             return True
         except Exception as e:
-            print(f"✗ Error clearing data: {e}")
+            logger.error("Error clearing data", extra={"error": str(e)})
             return False
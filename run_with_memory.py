@@ -2,8 +2,15 @@
 """Interactive Hackathon Matching Agent with Redis Memory"""
 
 import json
-from agent_new import HackathonMatchingAgent
-from redis_memory import RedisMemory
+import os
+from instrumentation import configure_logging, start_metrics_server
+
+# agent_new loads the roster at import time; configure logging first so its
+# "Loaded people" line (and Redis connection status) reach the console
+configure_logging()
+
+from agent_new import HackathonMatchingAgent, ROSTER_VERSION
+from redis_memory import RedisMemory, profile_version
 
 
 def display_menu():
@@ -79,8 +86,42 @@ def update_profile(profile: dict) -> dict:
     return profile
 
 
+def stream_matches(agent: HackathonMatchingAgent, profile: dict, shortlist: list = None) -> dict:
+    """Print agent progress and each match as soon as it arrives, return the final result"""
+    shown = 0
+    result = None
+    # Drain the stream rather than returning at "final", so the agent's spans finish normally
+    for event in agent.stream_match(profile, shortlist=shortlist):
+        if event["type"] == "tool_start":
+            args = ", ".join(f"{k}={v!r}" for k, v in event["args"].items())
+            print(f"  🔧 {event['name']}({args})", flush=True)
+        elif event["type"] == "tool_end":
+            if event["cached"]:
+                found = "already searched"
+            elif event["count"] is not None:
+                found = f"{event['count']} results"
+            else:
+                found = f"{event['bytes']} bytes"
+            print(f"     ✓ {found}", flush=True)
+        elif event["type"] == "match":
+            if shown == 0:
+                print("\n✅ Match Results:\n")
+            shown += 1
+            match = event["match"]
+            print(f"{shown}. {match['name']} ({match['title']}) - {match['reason']} [score {match['score']:g}]", flush=True)
+        elif event["type"] == "final":
+            if shown == 0:
+                print("\n✅ Match Results:\n")
+                print(event["matches"])
+            result = event
+    return result or {"matches": "Could not find matches", "success": False}
+
+
 def main():
     """Main application loop"""
+    if os.getenv("METRICS_PORT"):
+        start_metrics_server(int(os.getenv("METRICS_PORT")))
+    
     print("\n" + "=" * 60)
     print("🚀 Hackathon Matching Agent - Redis Memory Edition")
     print("=" * 60)
@@ -99,16 +140,21 @@ def main():
             print("\n" + "-" * 60)
             profile = get_or_create_profile(memory, username)
             
-            # Save profile to Redis
-            memory.save_user_profile(username, profile)
+            shortlist = None
+            if profile == memory.get_user_profile(username):
+                # Unchanged profile: keep its version, so a precomputed shortlist still applies
+                shortlist = [person_id for person_id, _ in memory.get_shortlist(
+                    f"user:{username}", ROSTER_VERSION, profile_version(profile),
+                    limit=agent.max_answer_candidates
+                )]
+            else:
+                # Save profile to Redis
+                memory.save_user_profile(username, profile)
             
             print(f"\n🔍 Finding matches for {profile['name']}...")
             print("-" * 60)
             
-            result = agent.match_person(profile)
-            
-            print("\n✅ Match Results:\n")
-            print(result["matches"])
+            result = stream_matches(agent, profile, shortlist=shortlist)
             
             # Save results to Redis
             memory.save_match_result(
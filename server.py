@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""HTTP matching service backed by HackathonMatchingAgent and RedisMemory
+
+The roster is loaded and indexed once in the parent process, which then
+forks a pool of workers sharing the listening socket. Workers inherit the
+roster copy-on-write, so startup cost and roster memory are paid once.
+Concurrent identical /match requests share one agent run: within a worker
+through a Future, and across workers through an in-flight key in Redis.
+
+Endpoints:
+    POST /match                  {"username": str?, "profile": dict?, "save": bool?}
+    GET  /profile/<username>
+    PUT  /profile/<username>     profile JSON
+    GET  /history/<username>?limit=5
+    GET  /healthz
+    GET  /metrics                Prometheus text for the worker that answers (per worker)
+"""
+
+import argparse
+import gc
+import hashlib
+import json
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import redis
+
+from instrumentation import configure_logging, metrics, span
+from redis_memory import profile_version
+
+
+logger = logging.getLogger(__name__)
+
+# Profile fields that change the agent's answer (updated_at etc. do not)
+MATCH_FIELDS = ("name", "skills", "interests", "experience_level", "role_preferences", "preferences")
+MAX_BODY_BYTES = 64 * 1024
+# A worker that exits non-zero or within MIN_WORKER_UPTIME seconds of starting
+# has failed: it is respawned with exponential backoff, and the pool stops after
+# MAX_WORKER_FAILURES failures in a row without a worker staying up in between
+MIN_WORKER_UPTIME = 5.0
+MAX_WORKER_FAILURES = 5
+RESPAWN_BACKOFF_BASE = 0.5
+RESPAWN_BACKOFF_MAX = 30.0
+# Cross-worker coalescing: the leader holds an in-flight key for at most
+# COALESCE_LOCK_TTL seconds (followers take over if it crashes), and its result
+# stays readable for COALESCE_RESULT_TTL seconds for followers that subscribe late
+COALESCE_LOCK_TTL = 300
+COALESCE_RESULT_TTL = 30
+COALESCE_POLL_INTERVAL = 1.0
+
+
+class BadRequest(Exception):
+    """The request itself is malformed (body, headers or query); answered with 400"""
+
+
+class RequestCoalescer:
+    """
+    Share one in-flight computation between concurrent callers with the same
+    key. The first caller runs the function; the rest wait for its result.
+
+    Callers in the same process wait on a Future. Given a Redis client, the
+    first caller across all workers also takes an in-flight key (SET NX with
+    a TTL) and publishes its JSON result; callers in other workers wait for
+    it, and take over if the key goes away without a result.
+    """
+
+    def __init__(self, redis_client=None, lock_ttl: float = COALESCE_LOCK_TTL):
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+        self.redis = redis_client
+        self.lock_ttl = lock_ttl
+
+    def run(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Return (result, coalesced) where coalesced is True for waiters"""
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+
+        if not leader:
+            metrics.inc("coalesced_requests_total", scope="worker")
+            return future.result()[0], True
+
+        try:
+            future.set_result(self._run_shared(key, fn) if self.redis is not None else (fn(), False))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+        return future.result()
+
+    def _run_shared(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run fn as the leader across workers, or wait for the worker that is"""
+        in_flight, result_key, channel = (f"coalesce:{kind}:{key}" for kind in ("inflight", "result", "done"))
+        token = uuid.uuid4().hex
+        while True:
+            try:
+                if self.redis.set(in_flight, token, nx=True, ex=self.lock_ttl):
+                    break
+                payload = self._wait_for_result(in_flight, result_key, channel)
+            except redis.RedisError as e:
+                logger.warning("Cross-worker coalescing unavailable, running locally", extra={"error": str(e)})
+                return fn(), False
+            if payload is not None:
+                outcome = json.loads(payload)
+                if "error" in outcome:
+                    raise RuntimeError(f"Coalesced match failed in another worker: {outcome['error']}")
+                metrics.inc("coalesced_requests_total", scope="redis")
+                return outcome["result"], True
+            # The leader went away without a result (crashed or timed out): take over
+
+        try:
+            result = fn()
+        except Exception as e:
+            self._finish(in_flight, result_key, channel, token, {"error": str(e)})
+            raise
+        except BaseException:
+            self._finish(in_flight, result_key, channel, token, None)
+            raise
+        self._finish(in_flight, result_key, channel, token, {"result": result})
+        return result, False
+
+    def _wait_for_result(self, in_flight: str, result_key: str, channel: str) -> Optional[str]:
+        """The leader's published outcome, or None once its in-flight key is gone without one"""
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(channel)
+            while True:
+                # Checked after subscribing, so a result published in between is not missed
+                payload = self.redis.get(result_key)
+                if payload is not None:
+                    return payload
+                if not self.redis.exists(in_flight):
+                    # The leader stores its result before releasing the key
+                    return self.redis.get(result_key)
+                message = pubsub.get_message(timeout=COALESCE_POLL_INTERVAL)
+                if message is not None:
+                    return message["data"]
+        finally:
+            pubsub.close()
+
+    def _finish(self, in_flight: str, result_key: str, channel: str, token: str,
+                outcome: Optional[Dict[str, Any]]) -> None:
+        """Publish the leader's outcome (if any) and release its in-flight key"""
+        try:
+            with self.redis.pipeline() as pipe:
+                # Only delete the key while we still own it; it may have expired and been taken over
+                pipe.watch(in_flight)
+                owned = pipe.get(in_flight) == token
+                pipe.multi()
+                if outcome is not None:
+                    payload = json.dumps(outcome, default=str)
+                    pipe.set(result_key, payload, ex=COALESCE_RESULT_TTL)
+                    pipe.publish(channel, payload)
+                if owned:
+                    pipe.delete(in_flight)
+                pipe.execute()
+        except redis.RedisError as e:
+            # Followers fall back to the key's TTL
+            logger.warning("Could not publish coalesced result", extra={"error": str(e)})
+
+
+def match_key(profile: Dict[str, Any]) -> str:
+    """Stable hash of the profile fields that affect matching"""
+    relevant = {field: profile.get(field) for field in MATCH_FIELDS}
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class MatchingService:
+    """Per-worker state: agent, Redis connection and coalescer"""
+
+    def __init__(self, agent, memory):
+        self.agent = agent
+        self.memory = memory
+        self.coalescer = RequestCoalescer(memory.redis_client)
+
+    def match(self, body: Any) -> Tuple[int, Dict[str, Any]]:
+        """Run (or join) a match for a profile or a saved user"""
+        import agent_new
+        
+        if not isinstance(body, dict):
+            return 400, {"error": "request body must be a JSON object"}
+        username = (body.get("username") or "").strip().lower() or None
+        profile = body.get("profile")
+        shortlist = None
+        if profile is None:
+            if not username:
+                return 400, {"error": "Provide a profile or a username with a saved profile"}
+            profile = self.memory.get_user_profile(username)
+            if profile is None:
+                return 404, {"error": f"No profile found for {username}"}
+            # Saved profiles may have a precomputed shortlist for this roster and profile version
+            shortlist = [person_id for person_id, _ in self.memory.get_shortlist(
+                f"user:{username}", agent_new.ROSTER_VERSION, profile_version(profile),
+                limit=self.agent.max_answer_candidates
+            )]
+        if not isinstance(profile, dict):
+            return 400, {"error": "profile must be a JSON object"}
+
+        result, coalesced = self.coalescer.run(
+            f"{agent_new.ROSTER_VERSION}:{match_key(profile)}",
+            lambda: self.agent.match_person(profile, shortlist=shortlist)
+        )
+
+        if username and body.get("save", True) and result.get("success"):
+            self.memory.save_match_result(
+                username,
+                result["matches"],
+                f"Skills: {', '.join(profile.get('skills', []))}, Interests: {', '.join(profile.get('interests', []))}"
+            )
+        return 200, {**result, "coalesced": coalesced}
+
+    def get_profile(self, username: str) -> Tuple[int, Dict[str, Any]]:
+        profile = self.memory.get_user_profile(username)
+        if profile is None:
+            return 404, {"error": f"No profile found for {username}"}
+        return 200, profile
+
+    def save_profile(self, username: str, profile: Any) -> Tuple[int, Dict[str, Any]]:
+        if not isinstance(profile, dict):
+            return 400, {"error": "profile must be a JSON object"}
+        if not self.memory.save_user_profile(username, profile):
+            return 503, {"error": "Could not save profile (is Redis available?)"}
+        return 200, profile
+
+    def get_history(self, username: str, limit: int) -> Tuple[int, Dict[str, Any]]:
+        return 200, {"username": username, "history": self.memory.get_match_history(username, limit=limit)}
+
+
+class MatchRequestHandler(BaseHTTPRequestHandler):
+    """Route JSON requests to the worker's MatchingService"""
+
+    service: Optional[MatchingService] = None
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Any:
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError as e:
+            raise BadRequest("Invalid Content-Length") from e
+        if length < 0:
+            raise BadRequest("Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise BadRequest("Request body too large")
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise BadRequest(f"Invalid JSON body: {e}") from e
+
+    def _username(self, path: str, prefix: str) -> Optional[str]:
+        username = path[len(prefix):].strip("/").lower()
+        return username or None
+
+    def _handle(self, method: str) -> None:
+        url = urlparse(self.path)
+        path = url.path.rstrip("/") or "/"
+        try:
+            with span("http.request", method=method, route=path.split("/")[1] if path != "/" else "/"):
+                status, payload = self._route(method, path, parse_qs(url.query))
+        except BadRequest as e:
+            status, payload = 400, {"error": str(e)}
+        except Exception as e:
+            logger.exception("Request failed", extra={"path": path})
+            status, payload = 500, {"error": str(e)}
+        metrics.inc("http_requests_total", method=method, status=status)
+        if isinstance(payload, str):
+            body = payload.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(status, payload)
+
+    def _route(self, method: str, path: str, query: Dict[str, list]) -> Tuple[int, Any]:
+        service = self.service
+        if method == "GET" and path == "/healthz":
+            import agent_new
+            return 200, {"status": "ok", "pid": os.getpid(), "people": len(agent_new.PEOPLE_DATA),
+                         "redis": service.memory.redis_client is not None}
+        if method == "GET" and path == "/metrics":
+            return 200, metrics.to_prometheus()
+        if method == "POST" and path == "/match":
+            return service.match(self._read_json())
+        if path.startswith("/profile/"):
+            username = self._username(path, "/profile/")
+            if username and method == "GET":
+                return service.get_profile(username)
+            if username and method in ("PUT", "POST"):
+                return service.save_profile(username, self._read_json())
+        if method == "GET" and path.startswith("/history/"):
+            username = self._username(path, "/history/")
+            if username:
+                try:
+                    limit = int(query.get("limit", ["5"])[0])
+                except ValueError as e:
+                    raise BadRequest("limit must be an integer") from e
+                return service.get_history(username, max(1, min(limit, 100)))
+        return 404, {"error": f"No route for {method} {path}"}
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def log_message(self, format, *args):
+        logger.info("request", extra={"client": self.address_string(), "request": format % args})
+
+
+def serve_worker(sock: socket.socket, agent, redis_host: str, redis_port: int) -> None:
+    """Serve requests on an already-listening socket until terminated"""
+    from redis_memory import RedisMemory
+
+    # Connections are opened per worker: sockets must not be shared across fork
+    MatchRequestHandler.service = MatchingService(agent, RedisMemory(host=redis_host, port=redis_port))
+    server = ThreadingHTTPServer(sock.getsockname()[:2], MatchRequestHandler, bind_and_activate=False)
+    server.socket.close()
+    server.socket = sock
+    server.daemon_threads = True
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    logger.info("Worker ready", extra={"pid": os.getpid()})
+    server.serve_forever()
+
+
+def run_prefork(host: str, port: int, workers: int, redis_host: str, redis_port: int) -> int:
+    """
+    Load the roster and build the agent, bind once, then fork and supervise
+    the worker pool. Returns the process exit code.
+    
+    Configuration errors (e.g. a missing ANTHROPIC_API_KEY) raise here,
+    before anything is forked.
+    """
+    with span("server.roster_load"):
+        import agent_new  # loads and indexes the roster in the parent
+    logger.info("Roster loaded", extra={"people": len(agent_new.PEOPLE_DATA)})
+    # The model client opens no connections until its first request, so one
+    # agent built here is safe for every worker to inherit
+    agent = agent_new.HackathonMatchingAgent()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    logger.info("Listening", extra={"host": host, "port": port, "workers": workers})
+
+    if workers <= 1 or not hasattr(os, "fork"):
+        serve_worker(sock, agent, redis_host, redis_port)
+        return 0
+
+    # Move everything allocated so far out of the GC's reach so collections in
+    # the workers don't touch (and copy) the shared roster pages
+    gc.collect()
+    gc.freeze()
+
+    children: Dict[int, float] = {}  # pid -> start time
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 1
+            try:
+                # The parent's handlers would run its stop() (and its copy of
+                # children) in this worker until serve_worker installs its own
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+                serve_worker(sock, agent, redis_host, redis_port)
+                exit_code = 0
+            except Exception:
+                logger.exception("Worker failed", extra={"pid": os.getpid()})
+            finally:
+                os._exit(exit_code)
+        children[pid] = time.monotonic()
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        spawn()
+
+    failures = 0
+    pool_exit_code = 0
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if stopping or started is None:
+            continue
+
+        exit_code = os.waitstatus_to_exitcode(status)
+        uptime = time.monotonic() - started
+        if uptime >= MIN_WORKER_UPTIME:
+            failures = 0
+        if exit_code != 0 or uptime < MIN_WORKER_UPTIME:
+            failures += 1
+        if failures >= MAX_WORKER_FAILURES:
+            logger.error("Workers keep failing, stopping the pool",
+                         extra={"pid": pid, "exit_code": exit_code, "failures": failures})
+            pool_exit_code = 1
+            stop()
+            continue
+
+        delay = min(RESPAWN_BACKOFF_MAX, RESPAWN_BACKOFF_BASE * 2 ** (failures - 1)) if failures else 0.0
+        logger.warning("Worker exited, restarting", extra={"pid": pid, "exit_code": exit_code,
+                                                           "uptime_s": round(uptime, 1), "delay_s": delay})
+        # Sleep in short steps so SIGTERM during a backoff is handled promptly
+        deadline = time.monotonic() + delay
+        while not stopping and time.monotonic() < deadline:
+            time.sleep(min(0.1, deadline - time.monotonic()))
+        if not stopping:
+            spawn()
+    sock.close()
+    return pool_exit_code
+
+
+def main():
+    """Parse arguments and start the service"""
+    parser = argparse.ArgumentParser(description="HTTP service for hackathon team matching")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8080")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WORKERS", os.cpu_count() or 1)))
+    parser.add_argument("--redis-host", default=os.getenv("REDIS_HOST", "localhost"))
+    parser.add_argument("--redis-port", type=int, default=int(os.getenv("REDIS_PORT", "6379")))
+    args = parser.parse_args()
+
+    configure_logging()
+    try:
+        exit_code = run_prefork(args.host, args.port, args.workers, args.redis_host, args.redis_port)
+    except ValueError as e:
+        logger.error("Cannot start the matching service", extra={"error": str(e)})
+        exit_code = 2
+    raise SystemExit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""Shared fixtures: modules are imported from the repo root, agent_new loads the bundled roster"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("ROSTER_PATH", os.path.join(ROOT, "lessie_export.xlsx"))
+
+
+@pytest.fixture
+def memory():
+    """RedisMemory backed by an in-process fakeredis"""
+    fakeredis = pytest.importorskip("fakeredis")
+    from redis_memory import RedisMemory
+    return RedisMemory(client=fakeredis.FakeRedis(decode_responses=True))
+
+
+@pytest.fixture
+def roster():
+    """The agent_new module with the bundled roster loaded"""
+    import agent_new
+    return agent_new
@@ -0,0 +1,209 @@
+"""Tests for the matching agent loop, run offline against ReplayChatModel"""
+
+import json
+import time
+
+import pytest
+
+from instrumentation import finished_spans, metrics
+from llm_replay import ReplayChatModel
+
+PROFILE = {
+    "name": "Sarah",
+    "skills": ["Strategy"],
+    "interests": ["FinTech"],
+    "experience_level": "intermediate",
+    "role_preferences": ["ML Engineer"],
+    "preferences": "Looking for machine learning engineers"
+}
+
+
+def answer(*entries):
+    return "\n".join(json.dumps(entry) for entry in entries)
+
+
+def person(roster, person_id, score=80):
+    return {"id": person_id, "name": roster.PEOPLE_INDEX["id"][person_id]["name"],
+            "reason": "Complements the team", "score": score}
+
+
+def make_agent(roster, sessions, **kwargs):
+    return roster.HackathonMatchingAgent(llm=ReplayChatModel(sessions), **kwargs)
+
+
+@pytest.fixture
+def session(roster):
+    """Search by skill, then answer with three roster people"""
+    return [
+        {"content": "", "tool_calls": [
+            {"name": "search_people_by_skill", "args": {"skill": "Strategy"}, "id": "t1"}
+        ]},
+        {"content": answer(person(roster, 3, 90), person(roster, 4, 85), person(roster, 8, 80)), "tool_calls": []}
+    ]
+
+
+def test_stream_match_closed_after_final_finishes_spans_ok(roster, session):
+    finished_spans.clear()
+    agent = make_agent(roster, [session])
+
+    for event in agent.stream_match(PROFILE):
+        if event["type"] == "final":
+            break
+
+    match_spans = [s for s in finished_spans if s.name == "agent.match"]
+    assert [s.status for s in match_spans] == ["ok"]
+
+
+def test_llm_span_excludes_time_spent_handling_tokens(roster, session):
+    metrics.reset()
+    agent = make_agent(roster, [session])
+
+    tokens = 0
+    for event in agent.stream_match(PROFILE):
+        if event["type"] == "token":
+            tokens += 1
+            time.sleep(0.01)
+
+    llm_seconds = metrics.histograms[("span_duration_seconds", (("span", "llm.invoke"), ("status", "ok")))].sum
+    assert tokens >= 3
+    assert llm_seconds < 0.01 * tokens / 2
+
+
+def test_validate_match_accepts_roster_entries(roster):
+    match, problem = roster._validate_match({"id": 3, "name": "liz kao", "reason": "Fraud PM", "score": 140})
+    assert problem is None
+    assert (match["id"], match["name"], match["score"]) == (3, "Liz Kao", 100.0)
+
+
+def test_validate_match_trusts_a_roster_name_over_a_wrong_id(roster):
+    match, problem = roster._validate_match({"id": 1, "name": "Liz Kao", "reason": "Fraud PM", "score": 70})
+    assert problem is None and match["id"] == 3
+
+
+@pytest.mark.parametrize("entry", [
+    {"id": 1, "name": "Nobody Here", "reason": "Great fit", "score": 90},
+    {"id": 9999, "name": "Nobody Here", "reason": "Great fit", "score": 90},
+    {"id": 3, "name": "Liz Kao", "reason": "", "score": 90},
+    {"id": 3, "name": "Liz Kao", "reason": "Great fit", "score": "nan"},
+    {"id": 3, "name": "Liz Kao", "reason": "Great fit", "score": "Infinity"},
+    {"id": 3, "name": "Liz Kao", "reason": "Great fit", "score": "high"},
+    ["not", "an", "object"],
+])
+def test_validate_match_rejects_bad_entries(roster, entry):
+    match, problem = roster._validate_match(entry)
+    assert match is None and problem
+
+
+def test_parse_answer_line(roster):
+    assert roster._parse_answer_line("Here are the matches:") == (None, None)
+    match, _ = roster._parse_answer_line('{"id": 3, "name": "Liz Kao", "reason": "PM", "score": NaN},')
+    assert match is None
+    match, problem = roster._parse_answer_line('{"id": 3, "name": "Liz Kao",')
+    assert match is None and problem.startswith("invalid JSON")
+
+
+def test_mismatched_answer_is_repaired(roster, session):
+    bad = {"id": 1, "name": "Nobody Here", "reason": "Great fit", "score": 90}
+    session[1] = {"content": answer(bad, person(roster, 3), person(roster, 4)), "tool_calls": []}
+    repaired = {"content": answer(person(roster, 8), person(roster, 5)), "tool_calls": []}
+    agent = make_agent(roster, [session + [repaired]])
+
+    result = agent.match_person(PROFILE)
+
+    assert result["success"]
+    assert [m["id"] for m in result["structured"]] == [3, 4, 8]
+    assert result["iterations"] == 3
+
+
+def test_listing_everyone_does_not_end_the_search(roster):
+    metrics.reset()
+    session = [
+        {"content": "", "tool_calls": [{"name": "get_all_people", "args": {}, "id": "t1"}]},
+        {"content": answer(person(roster, 3), person(roster, 4), person(roster, 8)), "tool_calls": []}
+    ]
+    result = make_agent(roster, [session]).match_person(PROFILE)
+
+    assert result["success"] and result["iterations"] == 2
+    assert not any(name == "agent_early_exits_total" for name, _ in metrics.counters)
+
+
+def test_answer_candidates_are_ranked_by_fit_with_the_profile(roster):
+    state = roster._LoopState({"name": "Sam", "skills": ["Strategy"], "interests": [], "role_preferences": []})
+    state.add_candidates(roster.get_all_people.invoke({}), targeted=False)
+    state.add_candidates(roster.search_people_by_skill.invoke({"skill": "Engineering"}))
+
+    top = state.top_candidates(3)
+
+    assert state.candidate_count() == len(roster.PEOPLE_INDEX["skills"]["engineering"])
+    assert len(top) == 3
+    assert all("Strategy" in p["skills"] for p in top)
+
+
+def test_repeated_tool_calls_are_answered_from_the_session_cache(roster):
+    metrics.reset()
+    call = {"name": "search_people_by_skill", "args": {"skill": "Strategy"}}
+    session = [
+        {"content": "", "tool_calls": [{**call, "id": "t1"}, {**call, "id": "t2"}]},
+        {"content": answer(person(roster, 3), person(roster, 4), person(roster, 8)), "tool_calls": []}
+    ]
+    tool_ends = [event for event in make_agent(roster, [session]).stream_match(PROFILE)
+                 if event["type"] == "tool_end"]
+
+    assert [event["cached"] for event in tool_ends] == [False, True]
+    assert "t1" in tool_ends[1]["preview"]
+    assert metrics.counters[("tool_calls_deduped_total", (("tool", "search_people_by_skill"),))] == 1
+
+
+def test_enough_candidates_ends_the_search_early(roster):
+    session = [
+        {"content": "", "tool_calls": [
+            {"name": "search_people_by_skill", "args": {"skill": "Engineering"}, "id": "t1"}
+        ]},
+        {"content": "", "tool_calls": [{"name": "get_all_people", "args": {}, "id": "t2"}]},
+        {"content": answer(person(roster, 3), person(roster, 4), person(roster, 8)), "tool_calls": []}
+    ]
+    llm = ReplayChatModel([session])
+    result = roster.HackathonMatchingAgent(llm=llm).match_person(PROFILE)
+
+    assert result["success"]
+    # One search turn, then the answer from a fresh prompt: get_all_people never ran
+    assert result["iterations"] == 2
+    assert llm.stats["tool_calls"] == 1
+
+
+def test_every_final_match_is_yielded_first(roster, session):
+    events = list(make_agent(roster, [session]).stream_match(PROFILE))
+    final = events[-1]
+
+    assert final["type"] == "final"
+    assert [e["match"] for e in events if e["type"] == "match"] == final["structured"]
+    assert set(final) == {"type", "matches", "success", "structured", "iterations"}
+
+
+def test_stream_match_is_not_profiled_while_its_consumer_runs(roster, session, monkeypatch, tmp_path):
+    monkeypatch.setenv("PROFILER", "cprofile")
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+    agent = make_agent(roster, [session, session])
+
+    list(agent.stream_match(PROFILE))
+    assert list(tmp_path.iterdir()) == []
+
+    agent.match_person(PROFILE)
+    assert len(list(tmp_path.glob("match_person-*.prof"))) == 1
+
+
+def test_tool_errors_go_back_to_the_model(roster):
+    session = [
+        {"content": "", "tool_calls": [{"name": "search_people_by_skill", "args": {"sklil": "AI"}, "id": "t1"}]},
+        {"content": "", "tool_calls": [
+            {"name": "search_people_by_skill", "args": {"skill": "Strategy"}, "id": "t2"}
+        ]},
+        {"content": answer(person(roster, 3), person(roster, 4), person(roster, 8)), "tool_calls": []}
+    ]
+    events = list(make_agent(roster, [session]).stream_match(PROFILE))
+
+    tool_ends = [event for event in events if event["type"] == "tool_end"]
+    assert [event["id"] for event in tool_ends] == ["t1", "t2"]
+    assert tool_ends[0]["preview"].startswith("Error calling search_people_by_skill")
+    assert tool_ends[0]["count"] is None
+    assert events[-1]["success"] and events[-1]["iterations"] == 3
@@ -0,0 +1,99 @@
+"""Tests for spans around generators and Redis tracing"""
+
+import time
+
+import pytest
+
+from instrumentation import _current_span, finished_spans, metrics, span, span_generator
+
+
+def span_seconds(name, status="ok"):
+    histogram = metrics.histograms.get(("span_duration_seconds", (("span", name), ("status", status))))
+    return histogram.sum if histogram else None
+
+
+@pytest.fixture(autouse=True)
+def clean_traces():
+    metrics.reset()
+    finished_spans.clear()
+    yield
+    assert _current_span.get() is None
+
+
+def test_span_generator_excludes_consumer_time():
+    def produce():
+        yield 1
+        yield 2
+        return "done"
+
+    def consume():
+        result = yield from span_generator("work", produce())
+        return result
+
+    gen = consume()
+    assert next(gen) == 1
+    time.sleep(0.05)
+    assert next(gen) == 2
+    time.sleep(0.05)
+    with pytest.raises(StopIteration) as stop:
+        next(gen)
+
+    assert stop.value.value == "done"
+    assert span_seconds("work") < 0.04
+    assert finished_spans[-1].attributes["consumer_wait_ms"] >= 90
+
+
+def test_span_generator_is_current_only_while_the_generator_runs():
+    seen = []
+
+    def produce():
+        with span("inner"):
+            seen.append(_current_span.get().parent_id)
+        yield 1
+
+    with span("outer") as outer:
+        for _ in span_generator("gen", produce()):
+            with span("consumer"):
+                pass
+
+    by_name = {s.name: s for s in finished_spans}
+    assert seen == [by_name["gen"].span_id]
+    assert by_name["gen"].parent_id == outer.span_id
+    # Work done by the consumer between items belongs to the consumer's span, not the generator
+    assert by_name["consumer"].parent_id == outer.span_id
+
+
+def test_closing_span_generator_early_is_not_an_error():
+    closed = []
+
+    def produce():
+        try:
+            yield 1
+            yield 2
+        finally:
+            closed.append(True)
+
+    gen = span_generator("work", produce())
+    next(gen)
+    gen.close()
+
+    assert closed == [True]
+    assert finished_spans[-1].status == "ok"
+
+
+def test_span_generator_marks_errors():
+    def produce():
+        yield 1
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        list(span_generator("work", produce()))
+    assert finished_spans[-1].status == "error"
+
+
+def test_redis_pipeline_execute_is_traced(memory):
+    memory.save_shortlist("user:sarah", "roster", "v1", [(1, 2.0), (2, 1.0)])
+
+    pipeline = [s for s in finished_spans if s.attributes.get("command") == "pipeline"]
+    assert len(pipeline) == 1
+    assert pipeline[0].attributes["commands"] == 3
@@ -0,0 +1,69 @@
+"""Tests for shortlist scoring and the precompute batch job"""
+
+import pytest
+
+from excel_data_loader import (INTEREST_WEIGHT, SKILL_WEIGHT, WANTED_SKILL_WEIGHT, build_people_index,
+                               score_candidates)
+from precompute_shortlists import main, precompute
+from redis_memory import profile_version
+
+PEOPLE = [
+    {"id": 1, "name": "Ada", "skills": ["Backend", "AI"], "interests": ["FinTech"], "role_preferences": ["Engineer"]},
+    {"id": 2, "name": "Bo", "skills": ["Design"], "interests": ["FinTech"], "role_preferences": ["Designer"]},
+    {"id": 3, "name": "Cy", "skills": ["General"], "interests": ["Technology"], "role_preferences": ["Recruiter"]},
+    {"id": 4, "name": "Sam", "skills": ["AI"], "interests": ["Health"], "role_preferences": ["Engineer"]},
+]
+INDEX = build_people_index(PEOPLE)
+
+
+def test_scores_by_weighted_overlap():
+    profile = {"name": "Sam", "skills": ["AI"], "interests": ["fintech"], "role_preferences": [],
+               "preferences": "Looking for a designer"}
+
+    scores = score_candidates(profile, INDEX, top_k=10)
+
+    # Sam is the profile owner, so is left out; Cy shares nothing
+    assert scores == [(1, SKILL_WEIGHT + INTEREST_WEIGHT), (2, INTEREST_WEIGHT)]
+
+
+def test_skills_named_in_preferences_are_wanted():
+    profile = {"name": "Zed", "skills": [], "interests": [], "role_preferences": [],
+               "preferences": "Need a backend person and some design help"}
+
+    assert score_candidates(profile, INDEX, top_k=10) == [(1, WANTED_SKILL_WEIGHT), (2, WANTED_SKILL_WEIGHT)]
+
+
+def test_placeholder_skill_is_never_wanted():
+    profile = {"name": "Zed", "skills": [], "interests": [], "role_preferences": [],
+               "preferences": "In general, anyone who ships"}
+
+    assert score_candidates(profile, INDEX, top_k=10) == []
+
+
+def test_top_k_and_exclude_id():
+    profile = {"name": "Zed", "skills": ["AI"], "interests": [], "role_preferences": []}
+
+    assert score_candidates(profile, INDEX, top_k=1) == [(1, SKILL_WEIGHT)]
+    assert score_candidates(profile, INDEX, top_k=10, exclude_id=1) == [(4, SKILL_WEIGHT)]
+
+
+def test_precompute_only_recomputes_changed_profiles(memory):
+    memory.save_user_profile("ada", {"name": "Zed", "skills": ["AI"], "interests": [], "role_preferences": []})
+    memory.save_user_profile("bo", {"name": "Yan", "skills": ["Design"], "interests": [], "role_preferences": []})
+
+    assert precompute(memory, PEOPLE, "r1", workers=1) == {"computed": 2, "skipped": 0}
+    assert precompute(memory, PEOPLE, "r1", workers=1) == {"computed": 0, "skipped": 2}
+
+    memory.update_user_preferences("bo", {"skills": ["AI"]})
+    assert precompute(memory, PEOPLE, "r1", workers=1) == {"computed": 1, "skipped": 1}
+    assert precompute(memory, PEOPLE, "r2", workers=1) == {"computed": 2, "skipped": 0}
+
+    bo = memory.get_user_profile("bo")
+    assert sorted(memory.get_shortlist("user:bo", "r2", profile_version(bo))) == [(1, SKILL_WEIGHT), (4, SKILL_WEIGHT)]
+
+
+def test_main_exits_non_zero_without_redis(monkeypatch):
+    monkeypatch.setattr("sys.argv", ["precompute_shortlists.py", "--redis-port", "1"])
+    with pytest.raises(SystemExit) as exit_info:
+        main()
+    assert exit_info.value.code == 1
@@ -0,0 +1,263 @@
+"""Tests for the HTTP matching service: coalescing, request handling and startup"""
+
+import http.client
+import json
+import socket
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import server
+from server import MatchingService, MatchRequestHandler, RequestCoalescer, match_key
+
+
+class FakeAgent:
+    """Stands in for HackathonMatchingAgent, recording each match_person call"""
+
+    max_answer_candidates = 40
+
+    def __init__(self):
+        self.calls = []
+
+    def match_person(self, profile, shortlist=None):
+        self.calls.append((profile, shortlist))
+        return {"matches": "1. Someone (Engineer) - Great fit [score 90]", "success": True,
+                "structured": [], "iterations": 1}
+
+
+PROFILE = {
+    "name": "Sarah",
+    "skills": ["AI"],
+    "interests": ["Healthcare"],
+    "experience_level": "intermediate",
+    "role_preferences": ["ML Engineer"],
+    "preferences": "Looking for backend developers"
+}
+
+
+def test_coalescer_shares_one_run_between_concurrent_callers():
+    coalescer = RequestCoalescer()
+    started, release = threading.Event(), threading.Event()
+    runs = []
+    results = []
+
+    def work():
+        runs.append(1)
+        started.set()
+        release.wait(5)
+        return "result"
+
+    def call():
+        results.append(coalescer.run("key", work))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    assert started.wait(5)
+    waiters = [threading.Thread(target=call) for _ in range(3)]
+    for thread in waiters:
+        thread.start()
+    time.sleep(0.2)
+    release.set()
+    for thread in [leader] + waiters:
+        thread.join(5)
+
+    assert len(runs) == 1
+    assert sorted(results) == [("result", False)] + [("result", True)] * 3
+
+
+def test_coalescer_propagates_errors_and_forgets_finished_keys():
+    coalescer = RequestCoalescer()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        coalescer.run("key", fail)
+    # The failed run is not cached: the next caller runs again
+    assert coalescer.run("key", lambda: 42) == (42, False)
+
+
+@pytest.fixture
+def worker_redis():
+    """Returns a new fakeredis client per call, all sharing one server (like separate workers)"""
+    fakeredis = pytest.importorskip("fakeredis")
+    shared = fakeredis.FakeServer()
+    return lambda: fakeredis.FakeRedis(server=shared, decode_responses=True)
+
+
+def test_coalescer_shares_one_run_across_workers(worker_redis):
+    leader, follower = RequestCoalescer(worker_redis()), RequestCoalescer(worker_redis())
+    started, release = threading.Event(), threading.Event()
+    runs = []
+    results = []
+
+    def work():
+        runs.append(1)
+        started.set()
+        release.wait(5)
+        return {"matches": "Ada"}
+
+    thread = threading.Thread(target=lambda: results.append(leader.run("key", work)))
+    thread.start()
+    assert started.wait(5)
+    waiter = threading.Thread(target=lambda: results.append(follower.run("key", work)))
+    waiter.start()
+    time.sleep(0.2)
+    release.set()
+    thread.join(5)
+    waiter.join(5)
+
+    assert len(runs) == 1
+    assert sorted(results, key=lambda r: r[1]) == [({"matches": "Ada"}, False), ({"matches": "Ada"}, True)]
+    # The in-flight key is released, so a later request runs again
+    assert follower.run("key", lambda: {"matches": "Bo"}) == ({"matches": "Bo"}, False)
+
+
+def test_coalescer_takes_over_when_the_leading_worker_goes_away(worker_redis, monkeypatch):
+    monkeypatch.setattr(server, "COALESCE_POLL_INTERVAL", 0.1)
+    client = worker_redis()
+    # A worker that took the key and crashed: it expires without a result
+    client.set("coalesce:inflight:key", "crashed", px=300)
+
+    assert RequestCoalescer(worker_redis()).run("key", lambda: 42) == (42, False)
+
+
+def test_coalescer_shares_errors_across_workers(worker_redis):
+    leader, follower = RequestCoalescer(worker_redis()), RequestCoalescer(worker_redis())
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("LLM unavailable")
+
+    def call(coalescer):
+        try:
+            coalescer.run("key", fail)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call, args=(leader,))]
+    threads[0].start()
+    assert started.wait(5)
+    threads.append(threading.Thread(target=call, args=(follower,)))
+    threads[1].start()
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(errors) == 2 and all("LLM unavailable" in error for error in errors)
+
+
+def test_match_key_ignores_fields_that_do_not_affect_matching():
+    assert match_key(PROFILE) == match_key({**PROFILE, "updated_at": "2025-01-01T00:00:00"})
+    assert match_key(PROFILE) != match_key({**PROFILE, "skills": ["Design"]})
+
+
+@pytest.mark.parametrize("body", [[1, 2], "profile", 3, None])
+def test_match_rejects_bodies_that_are_not_objects(memory, body):
+    status, payload = MatchingService(FakeAgent(), memory).match(body)
+    assert status == 400
+    assert "JSON object" in payload["error"]
+
+
+def test_match_validates_profile_and_username(memory):
+    service = MatchingService(FakeAgent(), memory)
+    assert service.match({})[0] == 400
+    assert service.match({"profile": ["not", "a", "dict"]})[0] == 400
+    assert service.match({"username": "nobody"})[0] == 404
+
+
+def test_match_for_saved_user_uses_shortlist_and_saves_history(memory, roster):
+    from redis_memory import profile_version
+
+    agent = FakeAgent()
+    service = MatchingService(agent, memory)
+    memory.save_user_profile("sarah", dict(PROFILE))
+    saved = memory.get_user_profile("sarah")
+    memory.save_shortlist("user:sarah", roster.ROSTER_VERSION, profile_version(saved), [(3, 9.0), (1, 5.0)])
+
+    status, payload = service.match({"username": " Sarah "})
+
+    assert status == 200
+    assert payload["coalesced"] is False
+    assert agent.calls[0][1] == [3, 1]
+    assert len(memory.get_match_history("sarah")) == 1
+
+
+@pytest.fixture
+def http_server(memory):
+    MatchRequestHandler.service = MatchingService(FakeAgent(), memory)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), MatchRequestHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd.server_address
+    httpd.shutdown()
+    httpd.server_close()
+    MatchRequestHandler.service = None
+
+
+def request(address, method, path, body=None):
+    conn = http.client.HTTPConnection(*address, timeout=5)
+    payload = body if isinstance(body, (bytes, type(None))) else json.dumps(body).encode("utf-8")
+    conn.request(method, path, body=payload)
+    response = conn.getresponse()
+    data = response.read().decode("utf-8")
+    conn.close()
+    if response.getheader("Content-Type", "").startswith("application/json"):
+        data = json.loads(data)
+    return response.status, data
+
+
+def test_routes(http_server, roster):
+    status, health = request(http_server, "GET", "/healthz")
+    assert status == 200 and health["people"] == len(roster.PEOPLE_DATA)
+
+    assert request(http_server, "PUT", "/profile/Sarah", PROFILE)[0] == 200
+    status, profile = request(http_server, "GET", "/profile/sarah")
+    assert status == 200 and profile["name"] == "Sarah"
+    assert request(http_server, "GET", "/profile/nobody")[0] == 404
+
+    status, result = request(http_server, "POST", "/match", {"username": "sarah"})
+    assert status == 200 and result["success"]
+    status, history = request(http_server, "GET", "/history/sarah?limit=1")
+    assert status == 200 and len(history["history"]) == 1
+
+    status, text = request(http_server, "GET", "/metrics")
+    assert status == 200 and "meetmatch_http_requests_total" in text
+    assert request(http_server, "GET", "/nope")[0] == 404
+    assert request(http_server, "POST", "/profile/")[0] == 404
+
+
+def test_bad_request_bodies_are_400(http_server):
+    assert request(http_server, "POST", "/match", [1, 2])[0] == 400
+    assert request(http_server, "POST", "/match", b"{not json")[0] == 400
+    assert request(http_server, "PUT", "/profile/sarah", [1, 2])[0] == 400
+
+
+def test_bad_query_and_headers_are_400(http_server):
+    assert request(http_server, "GET", "/history/sarah?limit=lots")[0] == 400
+
+    with socket.create_connection(http_server, timeout=5) as sock:
+        sock.sendall(b"POST /match HTTP/1.1\r\nHost: x\r\nContent-Length: -1\r\n\r\n")
+        assert sock.recv(1024).startswith(b"HTTP/1.1 400")
+
+
+def test_agent_errors_are_500_even_when_they_are_value_errors(http_server):
+    def fail(profile, shortlist=None):
+        raise ValueError("1 validation error for search_people_by_skill")
+
+    MatchRequestHandler.service.agent.match_person = fail
+    status, payload = request(http_server, "POST", "/match", {"profile": PROFILE})
+    assert status == 500
+    assert "validation error" in payload["error"]
+
+
+def test_prefork_fails_fast_without_api_key(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "")
+    with pytest.raises(ValueError, match="ANTHROPIC_API_KEY"):
+        server.run_prefork("127.0.0.1", 0, 2, "localhost", 6379)